@@ -9,8 +9,12 @@ from __future__ import annotations
 
 import os
 import json
+import time
+import random
+import struct
+import asyncio
 import logging
-from typing import Optional
+from typing import Optional, AsyncIterator, Tuple
 import aiohttp
 from urllib.parse import quote
 from dotenv import load_dotenv
@@ -21,8 +25,113 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 
+class BedrockThrottlingError(RuntimeError):
+    """Raised when Bedrock keeps throttling a request after all retries."""
+
+
+# Bedrock error types worth retrying even though they aren't 5xx (the model is busy, not the request bad)
+RETRYABLE_ERROR_TYPES = {"ModelTimeoutException", "ModelNotReadyException", "ServiceUnavailableException"}
+
+
+class BedrockRequestError(RuntimeError):
+    """Raised when Bedrock answers a request with an error status other than throttling."""
+
+    def __init__(self, status: int, error_type: str, body: str):
+        super().__init__(f"Bedrock returned {status} {error_type}: {body}" if error_type
+                         else f"Bedrock returned {status}: {body}")
+        self.status = status
+        self.error_type = error_type
+
+    @property
+    def retryable(self) -> bool:
+        """False for client errors (validation, access denied, ...) that will fail the same way again."""
+        return self.status >= 500 or self.error_type in RETRYABLE_ERROR_TYPES
+
+
+class RateLimiter:
+    """Async token bucket: `rate` requests per second, bursting up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+# Fixed sizes of the non-string header value types in the AWS event-stream encoding
+# (bool true/false, byte, short, int, long, timestamp, uuid)
+_EVENT_HEADER_SIZES = {0: 0, 1: 0, 2: 1, 3: 2, 4: 4, 5: 8, 8: 8, 9: 16}
+
+
+def _parse_event_headers(raw: bytes) -> dict:
+    """Decode the headers of one event-stream message, keeping only the string-valued ones."""
+    headers = {}
+    pos = 0
+    while pos < len(raw):
+        name_len = raw[pos]
+        name = raw[pos + 1:pos + 1 + name_len].decode("utf-8")
+        value_type = raw[pos + 1 + name_len]
+        pos += 2 + name_len
+        if value_type in (6, 7):  # byte array / string: 2-byte length prefix
+            (value_len,) = struct.unpack(">H", raw[pos:pos + 2])
+            if value_type == 7:
+                headers[name] = raw[pos + 2:pos + 2 + value_len].decode("utf-8")
+            pos += 2 + value_len
+        else:
+            pos += _EVENT_HEADER_SIZES[value_type]
+    return headers
+
+
+async def _iter_event_stream(content: aiohttp.StreamReader) -> AsyncIterator[Tuple[dict, bytes]]:
+    """
+    Yield (headers, payload) for each message of an application/vnd.amazon.eventstream body.
+    Frame: total length, headers length, prelude CRC (4 bytes each), headers, payload, message CRC.
+    The CRCs aren't checked; TLS already protects the bytes.
+    """
+    while True:
+        try:
+            prelude = await content.readexactly(12)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise
+            return
+        total_len, headers_len, _ = struct.unpack(">III", prelude)
+        message = await content.readexactly(total_len - 12)
+        yield _parse_event_headers(message[:headers_len]), message[headers_len:-4]
+
+
 class AWSBedrockClient:
-    def __init__(self):
+    def __init__(self, requests_per_second: Optional[float] = None, max_retries: int = 4, keep_alive: bool = False):
+        """
+        requests_per_second: if set, calls are paced by a client-side token bucket.
+        max_retries: retries (with exponential backoff) when Bedrock throttles a call.
+        keep_alive: reuse one HTTP session across calls; the caller must await close() when done.
+        """
+        self.keep_alive = keep_alive
+        self.rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+        self.max_retries = max_retries
+        # HTTP session reused across calls (keep-alive); recreated if the event loop changes
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop = None
         self.enabled = False
         self.region = os.getenv("AWS_REGION")
         self.api_key = os.getenv("AWS_API_KEY")
@@ -45,29 +154,32 @@ class AWSBedrockClient:
     def is_enabled(self) -> bool:
         return self.enabled
 
-    async def converse(self, prompt: str, system: str | None = None, model_id: Optional[str] = None, timeout: int = 120) -> dict:
-        """
-        Send a 'converse' style request to Bedrock. Returns a dict with the model's text under 'text'.
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled HTTP session for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession()
+            self._session_loop = loop
+        return self._session
 
-        If running in mock mode, returns a canned response helpful for testing.
-        """
-        chosen_model = model_id or self.fallback_model_id
-
-        if not self.enabled:
-            # Mock response for offline testing
-            debug_text = (
-                "[MOCK Bedrock response] This is a simulated Opus 4.1 reply.\n"
-                "The service would return an Outreach Dossier + Email following the system prompt and the user prompt."
-            )
-            return {"text": debug_text, "model": "mock-opus-4.1"}
+    async def close(self) -> None:
+        """Close the pooled HTTP session (call from the loop that used it)."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
 
+    def _build_request(self, chosen_model: str, action: str, prompt: str, system: str | None,
+                       cache_system: bool = False, latency_optimized: bool = False,
+                       tool: Optional[dict] = None) -> Tuple[str, dict, dict]:
+        """Return (url, headers, payload) for a converse / converse-stream call."""
         model_arn = f"arn:aws:bedrock:{self.region}:{self.account_id}:inference-profile/global.{chosen_model}"
         encoded = quote(model_arn, safe='')
-        url = f"https://bedrock-runtime.{self.region}.amazonaws.com/model/{encoded}/converse"
+        url = f"https://bedrock-runtime.{self.region}.amazonaws.com/model/{encoded}/{action}"
 
         headers = {
             "Content-Type": "application/json",
-            "X-Amz-Target": "AWSBedrockRuntime.Converse",
+            "X-Amz-Target": "AWSBedrockRuntime.ConverseStream" if action == "converse-stream" else "AWSBedrockRuntime.Converse",
             "Authorization": f"Bearer {self.api_key}",
         }
 
@@ -77,6 +189,8 @@ class AWSBedrockClient:
         # instructions into the top-level "system" field (list of text objects) instead.
         if system:
             system_block = [{"text": system}]
+            if cache_system:
+                system_block.append({"cachePoint": {"type": "default"}})
         else:
             system_block = None
 
@@ -90,44 +204,180 @@ class AWSBedrockClient:
             "additionalModelRequestFields": {},
         }
 
+        if latency_optimized:
+            payload["performanceConfig"] = {"latency": "optimized"}
+
+        if tool is not None:
+            payload["toolConfig"] = {
+                "tools": [{"toolSpec": tool}],
+                "toolChoice": {"tool": {"name": tool["name"]}},
+            }
+
         # attach system block as separate top-level field (Bedrock validation requires this)
         if system_block is not None:
             payload["system"] = system_block
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload, timeout=timeout) as resp:
-                text = await resp.text()
-                try:
-                    result = json.loads(text)
-                except Exception:
-                    raise RuntimeError(f"Bedrock returned non-JSON (status {resp.status}): {text[:1000]}")
-
-                # return the first candidate text (multiple Bedrock response shapes exist)
-                # Try the common 'output' -> 'message' -> 'content' chain first
-                if result.get("output") and result["output"].get("message"):
-                    content = result["output"]["message"].get("content", [])
-                    if content and isinstance(content, list):
-                        # content entries may be dicts with 'text' or plain strings
-                        first = content[0]
-                        if isinstance(first, dict) and 'text' in first:
-                            return {"text": first.get("text", ""), "model": chosen_model}
-                        if isinstance(first, str):
-                            return {"text": first, "model": chosen_model}
-
-                # Some responses use results -> outputs -> content -> items
-                if result.get('results') and isinstance(result['results'], list):
-                    for r in result['results']:
-                        outputs = r.get('outputs') or []
-                        for out in outputs:
-                            content = out.get('content') or []
-                            for item in content:
-                                if isinstance(item, dict) and item.get('type') in ('output_text', 'text'):
-                                    text = item.get('text') or item.get('value') or ''
-                                    if text:
-                                        return {"text": text, "model": chosen_model}
-
-                # Last fallback: if top-level returned string
-                if isinstance(result, str):
-                    return {"text": result, "model": chosen_model}
-
-                raise RuntimeError("Unexpected Bedrock response format: " + json.dumps(result)[:1000])
+        return url, headers, payload
+
+    async def converse(self, prompt: str, system: str | None = None, model_id: Optional[str] = None, timeout: int = 120,
+                       cache_system: bool = False, latency_optimized: bool = False,
+                       tool: Optional[dict] = None) -> dict:
+        """
+        Send a 'converse' style request to Bedrock. Returns a dict with the model's text under 'text'.
+
+        cache_system adds a prompt-cache checkpoint after the system prompt so an invariant
+        system prompt is read from Bedrock's prompt cache on repeated calls.
+
+        latency_optimized requests Bedrock's latency-optimized inference (performanceConfig).
+        Only some model/region pairs support it, and it can't be combined with cache_system.
+
+        tool is a Converse toolSpec ({"name", "description", "inputSchema": {"json": ...}}).
+        The model is forced to call it, and the parsed arguments come back under 'tool_input'
+        (so structured output needs no JSON extraction from the reply text).
+
+        The result also carries Bedrock's token 'usage' (including cacheReadInputTokens /
+        cacheWriteInputTokens when prompt caching applies), or {} if the response has none.
+
+        If running in mock mode, returns a canned response helpful for testing.
+        """
+        if cache_system and latency_optimized:
+            raise ValueError("cache_system and latency_optimized can't be used on the same request")
+
+        chosen_model = model_id or self.fallback_model_id
+
+        if not self.enabled:
+            # Mock response for offline testing
+            debug_text = (
+                "[MOCK Bedrock response] This is a simulated Opus 4.1 reply.\n"
+                "The service would return an Outreach Dossier + Email following the system prompt and the user prompt."
+            )
+            return {"text": debug_text, "model": "mock-opus-4.1"}
+
+        url, headers, payload = self._build_request(chosen_model, "converse", prompt, system,
+                                                    cache_system, latency_optimized, tool)
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
+
+            session = self._get_session() if self.keep_alive else aiohttp.ClientSession()
+            try:
+                async with session.post(url, headers=headers, json=payload, timeout=timeout) as resp:
+                    text = await resp.text()
+                    # e.g. "ValidationException:http://internal.amazon.com/coral/com.amazon.bedrock/"
+                    error_type = resp.headers.get("x-amzn-ErrorType", "").split(":", 1)[0]
+                    throttled = resp.status == 429 or error_type == "ThrottlingException"
+                    status = resp.status
+            finally:
+                if not self.keep_alive:
+                    await session.close()
+
+            if not throttled:
+                break
+            if attempt == self.max_retries:
+                raise BedrockThrottlingError(f"Bedrock throttled the request {attempt + 1} times: {text[:300]}")
+            delay = min(2 ** attempt, 30) + random.random()
+            logger.warning("Bedrock throttled (attempt %d), retrying in %.1fs", attempt + 1, delay)
+            await asyncio.sleep(delay)
+
+        if status >= 400:
+            raise BedrockRequestError(status, error_type, text[:1000])
+
+        try:
+            result = json.loads(text)
+        except Exception:
+            raise RuntimeError(f"Bedrock returned non-JSON (status {status}): {text[:1000]}")
+
+        usage = (result.get("usage") or {}) if isinstance(result, dict) else {}
+
+        # return the first candidate text (multiple Bedrock response shapes exist)
+        # Try the common 'output' -> 'message' -> 'content' chain first
+        if result.get("output") and result["output"].get("message"):
+            content = result["output"]["message"].get("content", [])
+            if tool is not None and isinstance(content, list):
+                for item in content:
+                    if isinstance(item, dict) and "toolUse" in item:
+                        return {"text": "", "tool_input": item["toolUse"].get("input", {}),
+                                "model": chosen_model, "usage": usage}
+            if content and isinstance(content, list):
+                # content entries may be dicts with 'text' or plain strings
+                first = content[0]
+                if isinstance(first, dict) and 'text' in first:
+                    return {"text": first.get("text", ""), "model": chosen_model, "usage": usage}
+                if isinstance(first, str):
+                    return {"text": first, "model": chosen_model, "usage": usage}
+
+        # Some responses use results -> outputs -> content -> items
+        if result.get('results') and isinstance(result['results'], list):
+            for r in result['results']:
+                outputs = r.get('outputs') or []
+                for out in outputs:
+                    content = out.get('content') or []
+                    for item in content:
+                        if isinstance(item, dict) and item.get('type') in ('output_text', 'text'):
+                            text = item.get('text') or item.get('value') or ''
+                            if text:
+                                return {"text": text, "model": chosen_model, "usage": usage}
+
+        # Last fallback: if top-level returned string
+        if isinstance(result, str):
+            return {"text": result, "model": chosen_model, "usage": {}}
+
+        raise RuntimeError("Unexpected Bedrock response format: " + json.dumps(result)[:1000])
+
+    async def converse_stream(self, prompt: str, system: str | None = None, model_id: Optional[str] = None,
+                              timeout: int = 120, cache_system: bool = False) -> AsyncIterator[dict]:
+        """
+        Stream a 'converse' request. Yields Bedrock's ConverseStream events as they arrive, each a
+        one-key dict like boto3's: {"contentBlockDelta": {"delta": {"text": ...}}}, then
+        {"messageStop": ...} and {"metadata": {"usage": ...}}.
+
+        timeout bounds the wait for each chunk rather than the whole generation. Throttling is
+        retried like converse() until the first byte; an error event mid-stream raises
+        BedrockThrottlingError / BedrockRequestError.
+
+        In mock mode the canned reply is yielded as a single delta.
+        """
+        chosen_model = model_id or self.fallback_model_id
+
+        if not self.enabled:
+            yield {"contentBlockDelta": {"contentBlockIndex": 0, "delta": {"text": (
+                "[MOCK Bedrock response] This is a simulated Opus 4.1 reply.\n"
+                "The service would return an Outreach Dossier + Email following the system prompt and the user prompt."
+            )}}}
+            yield {"messageStop": {"stopReason": "end_turn"}}
+            return
+
+        url, headers, payload = self._build_request(chosen_model, "converse-stream", prompt, system, cache_system)
+        client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                await self.rate_limiter.acquire()
+
+            session = self._get_session() if self.keep_alive else aiohttp.ClientSession()
+            try:
+                async with session.post(url, headers=headers, json=payload, timeout=client_timeout) as resp:
+                    if resp.status < 400:
+                        async for event_headers, body in _iter_event_stream(resp.content):
+                            event_type = event_headers.get(":event-type") or event_headers.get(":exception-type", "")
+                            if event_headers.get(":message-type") == "exception":
+                                if event_type == "throttlingException":
+                                    raise BedrockThrottlingError(f"Bedrock throttled mid-stream: {body[:300]!r}")
+                                raise BedrockRequestError(resp.status, event_type, body[:1000].decode("utf-8", "replace"))
+                            yield {event_type: json.loads(body) if body else {}}
+                        return
+
+                    text = await resp.text()
+                    error_type = resp.headers.get("x-amzn-ErrorType", "").split(":", 1)[0]
+            finally:
+                if not self.keep_alive:
+                    await session.close()
+
+            if resp.status != 429 and error_type != "ThrottlingException":
+                raise BedrockRequestError(resp.status, error_type, text[:1000])
+            if attempt == self.max_retries:
+                raise BedrockThrottlingError(f"Bedrock throttled the request {attempt + 1} times: {text[:300]}")
+            delay = min(2 ** attempt, 30) + random.random()
+            logger.warning("Bedrock throttled (attempt %d), retrying in %.1fs", attempt + 1, delay)
+            await asyncio.sleep(delay)
@@ -9,8 +9,9 @@ from __future__ import annotations
 
 import os
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
-from pymongo import MongoClient
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+from pymongo import MongoClient, UpdateOne, IndexModel, WriteConcern, ReturnDocument
+from pymongo.errors import OperationFailure
 from pymongo.collection import Collection
 from bson import ObjectId
 from dotenv import load_dotenv
@@ -25,6 +26,9 @@ if not MONGODB_URI:
     print("⚠️ ERROR: No MongoDB URI found in environment. Please copy .env.example -> .env and set MONGODB_URI.")
     sys.exit(1)
 DATABASE_NAME = "eulaiq_outreach"
+
+# Client name reported to the server (Atlas logs/profiler), e.g. "manage_leads" or "5_dispatch_emails"
+MONGODB_APPNAME = os.path.splitext(os.path.basename(sys.argv[0] if sys.argv else ""))[0] or "eulaiq_outreach"
 LEADS_COLLECTION = "leads"
 
 # Followup Pattern (days after initial outreach)
@@ -56,23 +60,60 @@ class LeadStatus:
     DEAD = "dead"                     # No response after all followups
 
 
+# Statuses covered by the partial status index: the in-progress pipeline. Leads that are done
+# (disqualified, followed up, converted, unsubscribed, dead) pile up but are rarely queried by status.
+ACTIVE_STATUSES = [
+    LeadStatus.HARVESTED, LeadStatus.QUALIFIED, LeadStatus.PENDING_REVIEW, LeadStatus.APPROVED,
+    LeadStatus.ASSET_GENERATING, LeadStatus.ASSET_GENERATED, LeadStatus.ASSET_PENDING_REVIEW,
+    LeadStatus.ASSET_APPROVED, LeadStatus.UPLOADED, LeadStatus.DRAFTED, LeadStatus.READY_TO_SEND,
+    LeadStatus.SENT, LeadStatus.REPLIED,
+]
+
+# Maximum notes kept per lead in notes_log (oldest are dropped by $slice on push)
+NOTES_LOG_LIMIT = 1000
+
+
 class OutreachDB:
     """MongoDB client for the outreach pipeline."""
     
     def __init__(self):
-        self.client = MongoClient(MONGODB_URI)
+        self.client = MongoClient(MONGODB_URI, appname=MONGODB_APPNAME)
         self.db = self.client[DATABASE_NAME]
         self.leads: Collection = self.db[LEADS_COLLECTION]
+        # Unacknowledged (w=0) view for bulk metadata writes that don't need a server reply
+        self.leads_fast: Collection = self.leads.with_options(write_concern=WriteConcern(w=0))
         
         # Ensure indexes for common queries
         self._ensure_indexes()
     
     def _ensure_indexes(self):
-        """Create indexes for performance."""
-        self.leads.create_index("channel_id", unique=True)
-        self.leads.create_index("status")
-        self.leads.create_index("next_followup_date")
-        self.leads.create_index("email")
+        """
+        Create indexes for performance, in a single createIndexes command (existing ones are
+        left as they are). The unique channel_id index backs every per-lead lookup and the
+        bulk $in prefetches.
+
+        Status equality queries on ACTIVE_STATUSES use the partial status index (needs
+        MongoDB 6.0+ for $in in partialFilterExpression); other statuses fall back to the
+        (status, scheduled_send_time) compound index.
+        """
+        # Replaced by the partial index below
+        try:
+            self.leads.drop_index("status_1")
+        except OperationFailure:
+            pass  # Already dropped
+        
+        self.leads.create_indexes([
+            IndexModel("channel_id", unique=True),
+            IndexModel("status", name="status_active",
+                       partialFilterExpression={"status": {"$in": ACTIVE_STATUSES}}),
+            IndexModel([("status", 1), ("scheduled_send_time", 1)]),
+            IndexModel([("status", 1), ("email", 1)]),
+            # Word search for search_leads (channel_id keeps its own unique index)
+            IndexModel([("creator_name", "text"), ("channel_name", "text"), ("email", "text")],
+                       name="text_search", default_language="none"),
+            IndexModel("next_followup_date"),
+            IndexModel("email"),
+        ])
     
     # ==================== CREATE ====================
     
@@ -170,20 +211,65 @@ class OutreachDB:
         """Get a lead by MongoDB _id."""
         return self.leads.find_one({"_id": ObjectId(lead_id)})
     
-    def get_lead_by_channel(self, channel_id: str) -> Optional[Dict]:
-        """Get a lead by YouTube channel ID."""
-        return self.leads.find_one({"channel_id": channel_id})
+    def get_lead_by_channel(self, channel_id: str, fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """Get a lead by YouTube channel ID (only `fields`, if given)."""
+        return self.leads.find_one({"channel_id": channel_id}, fields)
+    
+    def get_leads_by_channels(self, channel_ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Fetch several leads in one query, keyed by channel_id (missing IDs are simply absent)."""
+        if fields is not None and "channel_id" not in fields:
+            fields = [*fields, "channel_id"]
+        return {
+            lead["channel_id"]: lead
+            for lead in self.leads.find({"channel_id": {"$in": channel_ids}}, fields)
+        }
+    
+    def get_lead_with_recent_messages(self, channel_id: str, messages: int = 3,
+                                      notes: int = 5) -> Optional[Dict]:
+        """
+        Get a lead with only its last `messages` conversation_history entries and last `notes`
+        notes_log entries (sliced by MongoDB, so long threads don't cross the wire) plus the full
+        thread length as conversation_count.
+        """
+        history = {"$ifNull": ["$conversation_history", []]}
+        pipeline = [
+            {"$match": {"channel_id": channel_id}},
+            {"$limit": 1},
+            {"$addFields": {
+                "conversation_count": {"$size": history},
+                "conversation_history": {"$slice": [history, -messages]},
+                "notes_log": {"$slice": [{"$ifNull": ["$notes_log", []]}, -notes]},
+            }},
+        ]
+        return next(self.leads.aggregate(pipeline), None)
     
     def get_lead_by_email(self, email: str) -> Optional[Dict]:
         """Get a lead by email address."""
         return self.leads.find_one({"email": email})
     
-    def get_leads_by_status(self, status: str) -> List[Dict]:
-        """Get all leads with a specific status."""
-        return list(self.leads.find({"status": status}))
+    def get_leads_by_status(self, status: str, fields: Optional[List[str]] = None,
+                            limit: Optional[int] = None) -> List[Dict]:
+        """Get leads with a specific status (only `fields`, and at most `limit` leads, if given)."""
+        return list(self.leads.find({"status": status}, fields, limit=limit or 0))
+    
+    def iter_leads_by_status(self, status: str, fields: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Stream leads with a specific status without loading them all into memory."""
+        return self.leads.find({"status": status}, fields).batch_size(100)
+    
+    def count_by_status(self, status: str) -> int:
+        """Count leads with a specific status."""
+        return self.leads.count_documents({"status": status})
+    
+    def get_leads_ready_for_approval(self, fields: Optional[List[str]] = None) -> List[Dict]:
+        """Get drafted leads that have an email address (only `fields` if given)."""
+        return list(self.leads.find({"status": LeadStatus.DRAFTED, "email": {"$nin": [None, ""]}}, fields))
     
-    def get_leads_needing_followup(self, as_of: datetime = None) -> List[Dict]: # type: ignore
-        """Get leads where next_followup_date is today or earlier."""
+    def get_drafted_leads_without_email(self, fields: Optional[List[str]] = None) -> List[Dict]:
+        """Get drafted leads with a missing or empty email (only `fields` if given)."""
+        return list(self.leads.find({"status": LeadStatus.DRAFTED, "email": {"$in": [None, ""]}}, fields))
+    
+    def get_leads_needing_followup(self, as_of: datetime = None, fields: Optional[List[str]] = None) -> List[Dict]: # type: ignore
+        """Get leads where next_followup_date is today or earlier (only `fields` if given)."""
         if as_of is None:
             as_of = datetime.utcnow()
         
@@ -193,14 +279,23 @@ class OutreachDB:
         return list(self.leads.find({
             "next_followup_date": {"$lte": as_of},
             "status": {"$nin": terminal_states}
-        }))
+        }, fields))
     
-    def get_all_leads(self, limit: int = 100, skip: int = 0) -> List[Dict]:
-        """Get all leads with pagination."""
-        return list(self.leads.find().sort("created_at", -1).skip(skip).limit(limit))
+    def get_all_leads(self, limit: int = 100, skip: int = 0, fields: Optional[List[str]] = None) -> List[Dict]:
+        """Get all leads with pagination (only `fields` if given)."""
+        return list(self.leads.find({}, fields).sort("created_at", -1).skip(skip).limit(limit))
     
     def search_leads(self, query: str) -> List[Dict]:
-        """Search leads by name, channel, or email."""
+        """
+        Search leads by name, channel, or email. Whole words are matched through the text
+        index, best match first; partial words fall back to a case-insensitive regex scan.
+        """
+        matches = list(
+            self.leads.find({"$text": {"$search": query}}).sort([("score", {"$meta": "textScore"})])
+        )
+        if matches:
+            return matches
+        
         regex = {"$regex": query, "$options": "i"}
         return list(self.leads.find({
             "$or": [
@@ -234,6 +329,26 @@ class OutreachDB:
         )
         return result.modified_count > 0
     
+    def update_leads_bulk(self, updates: List[Tuple[str, Dict[str, Any]]], acknowledged: bool = True) -> Optional[int]:
+        """
+        Apply several (channel_id, $set fields) updates in one round-trip.
+        Returns the number of leads modified, or None with acknowledged=False: the write is
+        then sent with w=0 and doesn't wait for the server (nor report errors).
+        """
+        if not updates:
+            return 0
+        
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne({"channel_id": channel_id}, {"$set": {**fields, "updated_at": now}})
+            for channel_id, fields in updates
+        ]
+        if not acknowledged:
+            self.leads_fast.bulk_write(ops, ordered=False)
+            return None
+        result = self.leads.bulk_write(ops, ordered=False)
+        return result.modified_count
+    
     def set_asset_generated(self, channel_id: str, branded_url: str, s3_url: str = None, eulaiq_video_id: str = None): # type: ignore
         """Mark lead as having a generated asset."""
         self.update_lead_by_channel(channel_id, {
@@ -254,47 +369,130 @@ class OutreachDB:
             }
         })
     
-    def mark_ready_to_send(self, channel_id: str):
-        """Mark a draft as approved and ready to send."""
+    def set_draft_emails_bulk(self, drafts: List[Dict[str, str]]) -> int:
+        """
+        Save several draft emails in one round-trip.
+        Each draft has: channel_id, subject, body. Returns the number of leads modified.
+        """
+        if not drafts:
+            return 0
+        
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"channel_id": d["channel_id"]},
+                {"$set": {
+                    "status": LeadStatus.DRAFTED,
+                    "draft_email": {
+                        "subject": d["subject"],
+                        "body": d["body"],
+                        "drafted_at": now
+                    },
+                    "updated_at": now
+                }}
+            )
+            for d in drafts
+        ]
+        result = self.leads.bulk_write(ops, ordered=False)
+        return result.modified_count
+    
+    def finalize_draft(self, channel_id: str, subject: str, body: str, scheduled_send_time: datetime,
+                       status: str = LeadStatus.DRAFTED):
+        """Save an approved draft together with its send time and status in one write."""
         self.update_lead_by_channel(channel_id, {
-            "status": LeadStatus.READY_TO_SEND
+            "status": status,
+            "scheduled_send_time": scheduled_send_time,
+            "draft_email": {
+                "subject": subject,
+                "body": body,
+                "drafted_at": datetime.utcnow()
+            }
         })
     
-    def mark_sent(self, channel_id: str, subject: str, body: str, sent_via: str):
-        """Mark lead as sent and schedule first followup."""
-        now = datetime.utcnow()
-        next_followup = now + timedelta(days=FOLLOWUP_PATTERN[0])
+    def mark_ready_to_send(self, channel_id: str, fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        Mark a draft as approved and ready to send, in one round-trip. Only a lead with an email and
+        a drafted subject is changed; returns its updated `fields`, or None if nothing matched.
+        """
+        return self.leads.find_one_and_update(
+            {
+                "channel_id": channel_id,
+                "email": {"$nin": [None, ""]},
+                "draft_email.subject": {"$nin": [None, ""]},
+            },
+            {"$set": {"status": LeadStatus.READY_TO_SEND, "updated_at": datetime.utcnow()}},
+            projection=fields,
+            return_document=ReturnDocument.AFTER
+        )
+    
+    def mark_many_ready_to_send(self, channel_ids: List[str]) -> int:
+        """
+        Approve several drafted leads in one round-trip. Only leads still drafted and with an
+        email are changed. Returns the number of leads modified.
+        """
+        if not channel_ids:
+            return 0
         
-        self.leads.update_one(
-            {"channel_id": channel_id},
+        result = self.leads.update_many(
             {
-                "$set": {
-                    "status": LeadStatus.SENT,
-                    "reached_out_at": now,
-                    "next_followup_date": next_followup,
-                    "sent_email": {
-                        "subject": subject,
-                        "body": body,
-                        "sent_at": now,
-                        "sent_via": sent_via
-                    },
-                    "updated_at": now
+                "channel_id": {"$in": channel_ids},
+                "status": LeadStatus.DRAFTED,
+                "email": {"$nin": [None, ""]},
+            },
+            {"$set": {"status": LeadStatus.READY_TO_SEND, "updated_at": datetime.utcnow()}}
+        )
+        return result.modified_count
+    
+    def _sent_update(self, subject: str, body: str, sent_via: str, now: datetime) -> Dict[str, Any]:
+        """Update document that marks a lead as sent and schedules its first followup."""
+        return {
+            "$set": {
+                "status": LeadStatus.SENT,
+                "reached_out_at": now,
+                "next_followup_date": now + timedelta(days=FOLLOWUP_PATTERN[0]),
+                "sent_email": {
+                    "subject": subject,
+                    "body": body,
+                    "sent_at": now,
+                    "sent_via": sent_via
                 },
-                "$push": {
-                    "followup_thread": {
-                        "date": now,
-                        "type": "initial_outreach",
-                        "content": {"subject": subject, "body": body},
-                        "response": None
-                    }
+                "updated_at": now
+            },
+            "$push": {
+                "followup_thread": {
+                    "date": now,
+                    "type": "initial_outreach",
+                    "content": {"subject": subject, "body": body},
+                    "response": None
                 }
             }
+        }
+    
+    def mark_sent(self, channel_id: str, subject: str, body: str, sent_via: str):
+        """Mark lead as sent and schedule first followup."""
+        self.leads.update_one(
+            {"channel_id": channel_id},
+            self._sent_update(subject, body, sent_via, datetime.utcnow())
         )
     
-    def record_followup_sent(self, channel_id: str, followup_number: int, subject: str, body: str):
-        """Record a followup email and schedule the next one."""
-        now = datetime.utcnow()
+    def mark_sent_bulk(self, records: List[Dict[str, str]]) -> int:
+        """
+        Mark several leads as sent in one round-trip.
+        Each record has: channel_id, subject, body, sent_via. Returns the number of leads modified.
+        """
+        if not records:
+            return 0
         
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne({"channel_id": r["channel_id"]}, self._sent_update(r["subject"], r["body"], r["sent_via"], now))
+            for r in records
+        ]
+        result = self.leads.bulk_write(ops, ordered=False)
+        return result.modified_count
+    
+    def _followup_update(self, followup_number: int, subject: str, body: str, now: datetime) -> Dict[str, Any]:
+        """Update document that records a followup and schedules the next one."""
         # Determine next followup date (or None if this was the last)
         if followup_number < len(FOLLOWUP_PATTERN):
             next_followup = now + timedelta(days=FOLLOWUP_PATTERN[followup_number])
@@ -303,31 +501,55 @@ class OutreachDB:
             next_followup = None
             next_status = LeadStatus.DEAD  # No more followups
         
-        self.leads.update_one(
-            {"channel_id": channel_id},
-            {
-                "$set": {
-                    "status": next_status,
-                    "next_followup_date": next_followup,
-                    "followup_count": followup_number,
-                    "updated_at": now
-                },
-                "$push": {
-                    "followup_thread": {
-                        "date": now,
-                        "type": f"followup_{followup_number}",
-                        "content": {"subject": subject, "body": body},
-                        "response": None
-                    }
+        return {
+            "$set": {
+                "status": next_status,
+                "next_followup_date": next_followup,
+                "followup_count": followup_number,
+                "updated_at": now
+            },
+            "$push": {
+                "followup_thread": {
+                    "date": now,
+                    "type": f"followup_{followup_number}",
+                    "content": {"subject": subject, "body": body},
+                    "response": None
                 }
             }
+        }
+    
+    def record_followup_sent(self, channel_id: str, followup_number: int, subject: str, body: str):
+        """Record a followup email and schedule the next one."""
+        self.leads.update_one(
+            {"channel_id": channel_id},
+            self._followup_update(followup_number, subject, body, datetime.utcnow())
         )
     
-    def record_reply(self, channel_id: str, reply_content: str, reply_date: datetime = None): # pyright: ignore[reportArgumentType]
-        """Record that the creator replied."""
+    def record_followups_sent_bulk(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Record several followups in one round-trip.
+        Each record has: channel_id, followup_number, subject, body. Returns the number of leads modified.
+        """
+        if not records:
+            return 0
+        
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"channel_id": r["channel_id"]},
+                self._followup_update(r["followup_number"], r["subject"], r["body"], now)
+            )
+            for r in records
+        ]
+        result = self.leads.bulk_write(ops, ordered=False)
+        return result.modified_count
+    
+    def record_reply(self, channel_id: str, reply_content: str, reply_date: datetime = None, # pyright: ignore[reportArgumentType]
+                     fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """Record that the creator replied. Returns the lead's updated `fields`, or None if not found."""
         now = reply_date or datetime.utcnow()
         
-        self.leads.update_one(
+        return self.leads.find_one_and_update(
             {"channel_id": channel_id},
             {
                 "$set": {
@@ -342,7 +564,9 @@ class OutreachDB:
                         "content": reply_content
                     }
                 }
-            }
+            },
+            projection=fields,
+            return_document=ReturnDocument.AFTER
         )
     
     def record_outbound_message(self, channel_id: str, content: str):
@@ -363,34 +587,25 @@ class OutreachDB:
             }
         )
     
-    def add_note(self, channel_id: str, note: str):
-        """Append a note to the lead's notes field."""
+    def add_note(self, channel_id: str, note: str) -> bool:
+        """
+        Append a timestamped note to the lead's notes_log in a single server-side update (no read
+        first, so concurrent CLIs can't overwrite each other). Only the last NOTES_LOG_LIMIT are kept.
+        Returns False if no lead has this channel_id.
+        """
         now = datetime.utcnow()
-        timestamped_note = f"[{now.isoformat()}] {note}\n"
-        
-        # Check if notes is a string or array
-        lead = self.leads.find_one({"channel_id": channel_id}, {"notes": 1})
-        if lead and isinstance(lead.get("notes"), str):
-            # It's a string, append to it
-            new_notes = lead["notes"] + "\n" + timestamped_note
-            self.leads.update_one(
-                {"channel_id": channel_id},
-                {"$set": {"notes": new_notes, "updated_at": now}}
-            )
-        else:
-            # It's likely an array or doesn't exist, use $push
-            self.leads.update_one(
-                {"channel_id": channel_id},
-                {
-                    "$set": {"updated_at": now},
-                    "$push": {"notes": timestamped_note}
-                }
-            )
-        # Alternative: if notes is a string, use $concat or fetch-modify-save
+        result = self.leads.update_one(
+            {"channel_id": channel_id},
+            {
+                "$set": {"updated_at": now},
+                "$push": {"notes_log": {"$each": [{"ts": now, "text": note}], "$slice": -NOTES_LOG_LIMIT}}
+            }
+        )
+        return result.matched_count > 0
     
-    def update_email(self, channel_id: str, new_email: str):
-        """Update the email address for a lead."""
-        self.update_lead_by_channel(channel_id, {"email": new_email})
+    def update_email(self, channel_id: str, new_email: str) -> bool:
+        """Update the email address for a lead. Returns False if the lead doesn't exist."""
+        return self.update_lead_by_channel(channel_id, {"email": new_email})
     
     def set_status(self, channel_id: str, status: str):
         """Manually set the status of a lead."""
@@ -398,10 +613,9 @@ class OutreachDB:
     
     # ==================== DELETE ====================
     
-    def delete_lead(self, channel_id: str) -> bool:
-        """Delete a lead by channel_id."""
-        result = self.leads.delete_one({"channel_id": channel_id})
-        return result.deleted_count > 0
+    def delete_lead(self, channel_id: str, fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """Delete a lead by channel_id. Returns the deleted lead's `fields`, or None if not found."""
+        return self.leads.find_one_and_delete({"channel_id": channel_id}, projection=fields)
     
     # ==================== STATS ====================
     
@@ -413,6 +627,18 @@ class OutreachDB:
         results = list(self.leads.aggregate(pipeline))
         return {r["_id"]: r["count"] for r in results}
     
+    def get_drafts_for_review(self, fields: Optional[List[str]] = None) -> Tuple[List[Dict], int]:
+        """
+        Get drafted leads (only `fields` if given) and how many of them have an email.
+        The drafts come from a plain projected find (no single-document 16MB cap) and the
+        count is answered from the (status, email) index.
+        """
+        drafts = list(self.leads.find({"status": LeadStatus.DRAFTED}, fields))
+        with_email = self.leads.count_documents(
+            {"status": LeadStatus.DRAFTED, "email": {"$nin": [None, ""]}}
+        )
+        return drafts, with_email
+    
     def get_total_leads(self) -> int:
         """Get total number of leads."""
         return self.leads.count_documents({})
@@ -498,6 +724,33 @@ class OutreachDB:
             "uploaded_at": datetime.utcnow()
         })
     
+    def set_youtube_uploaded_bulk(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Record several YouTube uploads in one round-trip.
+        Each record has: channel_id, youtube_video_id, youtube_url, channel_used
+        Returns the number of leads modified.
+        """
+        if not records:
+            return 0
+        
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"channel_id": r["channel_id"]},
+                {"$set": {
+                    "status": LeadStatus.UPLOADED,
+                    "youtube_video_id": r["youtube_video_id"],
+                    "youtube_url": r["youtube_url"],
+                    "youtube_channel_used": r["channel_used"],
+                    "uploaded_at": now,
+                    "updated_at": now
+                }}
+            )
+            for r in records
+        ]
+        result = self.leads.bulk_write(ops, ordered=False)
+        return result.modified_count
+    
     def get_leads_for_video_review(self) -> List[Dict]:
         """Get leads with dual videos pending selection."""
         return list(self.leads.find({"status": LeadStatus.ASSET_PENDING_REVIEW}))
@@ -515,7 +768,10 @@ class OutreachDB:
 _db_instance = None
 
 def get_db() -> OutreachDB:
-    """Get the singleton database instance."""
+    """
+    Get the singleton database instance. The MongoClient (its connection pool and topology
+    discovery) and the index check run once per process; later calls reuse them.
+    """
     global _db_instance
     if _db_instance is None:
         _db_instance = OutreachDB()
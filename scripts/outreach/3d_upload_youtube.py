@@ -13,21 +13,20 @@ Requirements:
 Environment Variables:
 - YOUTUBE_CHANNELS: JSON array of channel configs with OAuth tokens
 """
-import json
+import asyncio
+import io
+import orjson
 import os
 import sys
 import argparse
+import aiohttp
 import requests
-import time
 from pathlib import Path
 from datetime import datetime, timedelta
 from itertools import cycle
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.errors import HttpError
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from db_client import get_db, LeadStatus
@@ -39,6 +38,11 @@ load_dotenv()
 SCOPES = ['https://www.googleapis.com/auth/youtube.upload']
 VIDEOS_PER_CHANNEL_PER_DAY = 5  # Stay under 6 to be safe
 TOTAL_DAILY_LIMIT = 20  # 4 channels x 5 videos
+DB_FLUSH_EVERY = 4  # Write upload results to the DB in batches of this size
+UPLOAD_CHUNK_SIZE = 100 * 1024 * 1024  # 100MB resumable-upload chunks (must be a multiple of 256KB)
+READ_BUFFER_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_RETRIES = 5
+RESUMABLE_UPLOAD_URL = "https://www.googleapis.com/upload/youtube/v3/videos?uploadType=resumable&part=snippet,status"
 
 # Directories
 CREDENTIALS_DIR = Path(__file__).parent.parent.parent / "credentials"
@@ -50,6 +54,9 @@ VIDEO_DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
 # Track daily uploads per channel
 UPLOAD_TRACKER_FILE = Path(__file__).parent.parent.parent / "data" / "youtube_upload_tracker.json"
 
+# OAuth credentials keyed by channel_id (reused across uploads in one run)
+_YT_CREDENTIALS_CACHE = {}
+
 
 def load_youtube_channels():
     """
@@ -63,7 +70,7 @@ def load_youtube_channels():
         sys.exit(1)
     
     try:
-        channels = json.loads(env_channels)
+        channels = orjson.loads(env_channels)
         if not isinstance(channels, list) or len(channels) == 0:
             raise ValueError("YOUTUBE_CHANNELS must be a non-empty JSON array")
         return channels
@@ -77,8 +84,7 @@ def get_upload_tracker():
     UPLOAD_TRACKER_FILE.parent.mkdir(parents=True, exist_ok=True)
     
     if UPLOAD_TRACKER_FILE.exists():
-        with open(UPLOAD_TRACKER_FILE, 'r') as f:
-            tracker = json.load(f)
+        tracker = orjson.loads(UPLOAD_TRACKER_FILE.read_bytes())
     else:
         tracker = {"date": None, "channels": {}}
     
@@ -93,8 +99,7 @@ def get_upload_tracker():
 
 def save_upload_tracker(tracker):
     """Save the upload tracker."""
-    with open(UPLOAD_TRACKER_FILE, 'w') as f:
-        json.dump(tracker, f, indent=2)
+    UPLOAD_TRACKER_FILE.write_bytes(orjson.dumps(tracker, option=orjson.OPT_INDENT_2))
 
 
 def get_channel_uploads_today(tracker, channel_id):
@@ -110,27 +115,30 @@ def increment_channel_uploads(tracker, channel_id):
     save_upload_tracker(tracker)
 
 
-def get_youtube_service(channel_config):
+def get_youtube_credentials(channel_config, force_refresh=False):
     """
-    Get authenticated YouTube service for a channel.
-    Uses stored OAuth tokens from environment.
+    Get valid OAuth credentials for a channel.
+    Uses stored OAuth tokens from environment; cached per channel for the run.
+    force_refresh gets a new access token even if the cached one doesn't look expired
+    (for when YouTube has already rejected it with a 401).
     """
     channel_id = channel_config["channel_id"]
     
-    # Build credentials from stored tokens
-    creds_data = {
-        "token": channel_config.get("access_token"),
-        "refresh_token": channel_config.get("refresh_token"),
-        "token_uri": "https://oauth2.googleapis.com/token",
-        "client_id": channel_config.get("client_id"),
-        "client_secret": channel_config.get("client_secret"),
-        "scopes": SCOPES
-    }
-    
-    credentials = Credentials.from_authorized_user_info(creds_data, SCOPES)
+    credentials = _YT_CREDENTIALS_CACHE.get(channel_id)
+    if credentials is None:
+        # Build credentials from stored tokens
+        creds_data = {
+            "token": channel_config.get("access_token"),
+            "refresh_token": channel_config.get("refresh_token"),
+            "token_uri": "https://oauth2.googleapis.com/token",
+            "client_id": channel_config.get("client_id"),
+            "client_secret": channel_config.get("client_secret"),
+            "scopes": SCOPES
+        }
+        credentials = Credentials.from_authorized_user_info(creds_data, SCOPES)
     
-    # Refresh if expired
-    if credentials.expired and credentials.refresh_token:
+    # Refresh if expired (or if we only have a refresh token)
+    if (force_refresh or credentials.expired or not credentials.token) and credentials.refresh_token:
         try:
             credentials.refresh(Request())
             # Note: In production, you'd want to update the stored token
@@ -139,11 +147,8 @@ def get_youtube_service(channel_config):
             print(f"  ⚠️ Failed to refresh credentials: {e}")
             return None
     
-    try:
-        return build('youtube', 'v3', credentials=credentials)
-    except Exception as e:
-        print(f"  ⚠️ Failed to build YouTube service: {e}")
-        return None
+    _YT_CREDENTIALS_CACHE[channel_id] = credentials
+    return credentials
 
 
 def download_video_for_upload(s3_url, video_id):
@@ -172,9 +177,63 @@ def download_video_for_upload(s3_url, video_id):
         return None
 
 
-def upload_to_youtube(youtube_service, video_path, title, description):
+def open_video_for_upload(video_path):
+    """
+    Open a video for sequential reading.
+    On Linux, hints the kernel to read ahead so chunks are in page cache before they're sent.
+    """
+    fd = os.open(str(video_path), os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    return io.BufferedReader(io.FileIO(fd, "rb", closefd=True), buffer_size=READ_BUFFER_SIZE)
+
+
+async def _start_resumable_session(session, token, body, total_size):
+    """Step 1 of the resumable protocol: POST metadata, get the session URI."""
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json; charset=UTF-8",
+        "X-Upload-Content-Type": "video/mp4",
+        "X-Upload-Content-Length": str(total_size)
+    }
+    for attempt in range(MAX_UPLOAD_RETRIES + 1):
+        async with session.post(RESUMABLE_UPLOAD_URL, headers=headers, data=orjson.dumps(body)) as resp:
+            if resp.status == 200:
+                return resp.headers["Location"]
+            if resp.status < 500 or attempt == MAX_UPLOAD_RETRIES:
+                raise RuntimeError(f"Could not start upload session ({resp.status}): {await resp.text()}")
+        await asyncio.sleep(2 ** attempt)
+
+
+async def _query_upload_offset(session, session_uri, total_size, token):
+    """Ask the server how many bytes it has; returns (next_offset, response_json or None)."""
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Length": "0",
+        "Content-Range": f"bytes */{total_size}"
+    }
+    async with session.put(session_uri, headers=headers) as resp:
+        if resp.status in (200, 201):
+            return total_size, await resp.json(content_type=None)
+        if resp.status == 308:
+            return _next_offset(resp.headers), None
+        raise RuntimeError(f"Upload status query failed ({resp.status})")
+
+
+def _next_offset(headers):
+    """Parse the Range header of a 308 response ('bytes=0-N') into the next byte to send."""
+    range_header = headers.get("Range")
+    if not range_header:
+        return 0
+    return int(range_header.rsplit("-", 1)[1]) + 1
+
+
+async def upload_to_youtube(session, credentials, video_path, title, description, label="", yt_channel=None):
     """
-    Upload video to YouTube as unlisted.
+    Upload video to YouTube as unlisted using the resumable upload protocol.
+    If the access token expires mid-upload (401), it is refreshed from yt_channel's config
+    and the upload resumes from the last byte YouTube received.
     Returns (video_id, video_url) on success.
     """
     body = {
@@ -190,61 +249,197 @@ def upload_to_youtube(youtube_service, video_path, title, description):
         }
     }
     
-    media = MediaFileUpload(
-        str(video_path),
-        mimetype='video/mp4',
-        resumable=True,
-        chunksize=1024*1024  # 1MB chunks
-    )
+    total_size = os.path.getsize(video_path)
+    reader = open_video_for_upload(video_path)
     
     try:
-        request = youtube_service.videos().insert(
-            part='snippet,status',
-            body=body,
-            media_body=media
-        )
+        session_uri = await _start_resumable_session(session, credentials.token, body, total_size)
         
+        print(f"    {label}Uploading ({total_size // (1024*1024)}MB)...")
+        offset = 0
+        retries = 0
+        refreshed = False  # One token refresh per stretch of progress, so a bad grant can't loop
         response = None
-        print(f"    Uploading", end="", flush=True)
         
         while response is None:
-            status, response = request.next_chunk()
-            if status:
-                print(".", end="", flush=True)
+            reader.seek(offset)
+            chunk = await asyncio.to_thread(reader.read, UPLOAD_CHUNK_SIZE)
+            end = offset + len(chunk) - 1
+            headers = {
+                "Authorization": f"Bearer {credentials.token}",
+                "Content-Length": str(len(chunk)),
+                "Content-Range": f"bytes {offset}-{end}/{total_size}"
+            }
+            unauthorized = False
+            
+            try:
+                async with session.put(session_uri, headers=headers, data=chunk) as resp:
+                    if resp.status in (200, 201):
+                        response = await resp.json(content_type=None)
+                    elif resp.status == 308:
+                        offset = _next_offset(resp.headers)
+                        retries = 0
+                        refreshed = False
+                        print(f"    {label}{offset * 100 // total_size}% sent")
+                    elif resp.status == 401 and yt_channel is not None and not refreshed:
+                        unauthorized = True
+                    elif resp.status >= 500:
+                        raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+                    else:
+                        print(f"    {label}Upload failed ({resp.status}): {await resp.text()}")
+                        return None, None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Retry with exponential backoff, resuming from what the server received
+                if retries >= MAX_UPLOAD_RETRIES:
+                    print(f"    {label}Upload failed after {retries} retries: {e}")
+                    return None, None
+                retries += 1
+                await asyncio.sleep(2 ** retries)
+                offset, response = await _query_upload_offset(session, session_uri, total_size, credentials.token)
+                continue
+            
+            if unauthorized:
+                # Token expired part-way: refresh it and resume where YouTube left off
+                refreshed = True
+                credentials = await asyncio.to_thread(get_youtube_credentials, yt_channel, True)
+                if not credentials:
+                    print(f"    {label}Upload failed: could not refresh YouTube credentials")
+                    return None, None
+                print(f"    {label}Access token refreshed, resuming upload")
+                offset, response = await _query_upload_offset(session, session_uri, total_size, credentials.token)
         
-        print(" Done!")
+        print(f"    {label}Done!")
         
         video_id = response['id']
         video_url = f"https://youtu.be/{video_id}"
         
         return video_id, video_url
         
-    except HttpError as e:
-        print(f"\n    Upload failed: {e}")
-        return None, None
     except Exception as e:
-        print(f"\n    Upload error: {e}")
+        print(f"    {label}Upload error: {e}")
         return None, None
+    finally:
+        reader.close()
 
 
-def select_channel_for_upload(channels, tracker):
+def assign_channels(leads, channels, tracker):
     """
-    Select the next channel to use for upload (round-robin with daily limits).
-    Returns channel config or None if all channels are at limit.
+    Assign each lead a channel round-robin, respecting per-channel daily limits.
+    Returns {channel_id: [lead, ...]}; leads beyond total capacity are left out.
     """
-    for channel in channels:
-        channel_id = channel["channel_id"]
-        uploads_today = get_channel_uploads_today(tracker, channel_id)
-        
-        if uploads_today < VIDEOS_PER_CHANNEL_PER_DAY:
-            return channel
+    planned = {c["channel_id"]: get_channel_uploads_today(tracker, c["channel_id"]) for c in channels}
+    assignments = {c["channel_id"]: [] for c in channels}
+    
+    rotation = cycle(channels)
+    for lead in leads:
+        for _ in range(len(channels)):
+            channel = next(rotation)
+            if planned[channel["channel_id"]] < VIDEOS_PER_CHANNEL_PER_DAY:
+                planned[channel["channel_id"]] += 1
+                assignments[channel["channel_id"]].append(lead)
+                break
+        else:
+            break  # All channels at limit
     
-    return None  # All channels at limit
+    return assignments
 
 
-def process_uploads(limit=None, dry_run=False):
+async def upload_channel_queue(session, yt_channel, leads, db, tracker, stats, pending_records):
+    """
+    Upload one channel's leads in order.
+    The next lead's video is downloaded while the current one uploads.
+    """
+    channel_name = yt_channel.get('name', yt_channel['channel_id'][:8])
+    
+    credentials = await asyncio.to_thread(get_youtube_credentials, yt_channel)
+    if not credentials:
+        print(f"  ⚠️ [{channel_name}] Failed to authenticate with YouTube - skipping {len(leads)} videos")
+        stats["failed"] += len(leads)
+        return
+    
+    def start_download(lead):
+        video_key = lead.get("eulaiq_video_id", lead["channel_id"][:8])
+        return asyncio.create_task(asyncio.to_thread(download_video_for_upload, lead["s3_video_url"], video_key))
+    
+    next_download = start_download(leads[0])
+    
+    try:
+        for i, lead in enumerate(leads):
+            channel_id = lead["channel_id"]
+            creator_name = lead.get("creator_name", lead.get("channel_name", "Unknown"))
+            video_title = lead.get("video_title", "Unknown Video")
+            label = f"[{channel_name}] {creator_name}: "
+            
+            video_path = await next_download
+            if i + 1 < len(leads):
+                next_download = start_download(leads[i + 1])
+            
+            if not video_path:
+                print(f"  ⚠️ {label}Video download failed - skipping")
+                stats["failed"] += 1
+                continue
+            
+            if credentials.expired:
+                credentials = await asyncio.to_thread(get_youtube_credentials, yt_channel)
+                if not credentials:
+                    print(f"  ⚠️ {label}Failed to authenticate with YouTube - skipping")
+                    stats["failed"] += 1
+                    continue
+            
+            # Prepare description
+            description = f"""Animation demo for {creator_name}
+
+Original video: {lead.get('video_url', 'N/A')}
+
+Created with EulaIQ - AI-powered educational animation
+"""
+            
+            # Upload
+            yt_video_id, yt_url = await upload_to_youtube(
+                session,
+                credentials,
+                video_path,
+                f"[Demo] {video_title}",
+                description,
+                label=label,
+                yt_channel=yt_channel
+            )
+            
+            if yt_video_id and yt_url:
+                # Queue database update
+                pending_records.append({
+                    "channel_id": channel_id,
+                    "youtube_video_id": yt_video_id,
+                    "youtube_url": yt_url,
+                    "channel_used": yt_channel["channel_id"]
+                })
+                if len(pending_records) >= DB_FLUSH_EVERY:
+                    batch = pending_records[:]
+                    pending_records.clear()
+                    await asyncio.to_thread(db.set_youtube_uploaded_bulk, batch)
+            
+                # Update tracker
+                increment_channel_uploads(tracker, yt_channel["channel_id"])
+            
+                stats["uploaded"] += 1
+                print(f"  ✅ {label}Uploaded: {yt_url}")
+            else:
+                stats["failed"] += 1
+                print(f"  ❌ {label}Upload failed")
+            
+            # Small delay between uploads on the same channel
+            if i + 1 < len(leads):
+                await asyncio.sleep(2)
+    finally:
+        # Don't leave the prefetch running if an upload raised out of the loop
+        if not next_download.done():
+            next_download.cancel()
+
+
+async def process_uploads_async(limit=None, dry_run=False):
     """
     Upload approved videos to YouTube.
+    Each YouTube channel works through its own queue; all channels upload concurrently.
     """
     db = get_db()
     channels = load_youtube_channels()
@@ -274,95 +469,58 @@ def process_uploads(limit=None, dry_run=False):
         print("⚠️ Daily upload limit reached. Try again tomorrow.")
         return
     
-    uploaded = 0
-    failed = 0
+    stats = {"uploaded": 0, "failed": 0}
     
-    for i, lead in enumerate(leads, 1):
-        if uploaded >= remaining_capacity:
-            print(f"\n⚠️ Daily limit reached. {len(leads) - i + 1} videos remaining for tomorrow.")
-            break
-        
-        channel_id = lead["channel_id"]
-        creator_name = lead.get("creator_name", lead.get("channel_name", "Unknown"))
-        video_title = lead.get("video_title", "Unknown Video")
-        s3_url = lead.get("s3_video_url")
-        
-        print(f"[{i}/{len(leads)}] {creator_name}")
-        print(f"  Title: {video_title}")
-        
-        if not s3_url:
-            print("  ⚠️ No S3 URL found - skipping")
-            failed += 1
-            continue
-        
-        # Select a channel that hasn't hit daily limit
-        yt_channel = select_channel_for_upload(channels, tracker)
-        if not yt_channel:
-            print("  ⚠️ All channels at daily limit")
-            break
-        
-        print(f"  Using channel: {yt_channel.get('name', yt_channel['channel_id'][:8])}")
-        
-        if dry_run:
-            print(f"  [DRY RUN] Would upload to YouTube")
-            continue
-        
-        # Download video
-        video_path = download_video_for_upload(s3_url, lead.get("eulaiq_video_id", channel_id[:8]))
-        if not video_path:
-            print("  ⚠️ Video download failed - skipping")
-            failed += 1
-            continue
-        
-        # Get YouTube service
-        youtube_service = get_youtube_service(yt_channel)
-        if not youtube_service:
-            print("  ⚠️ Failed to authenticate with YouTube - skipping")
-            failed += 1
-            continue
-        
-        # Prepare description
-        description = f"""Animation demo for {creator_name}
-
-Original video: {lead.get('video_url', 'N/A')}
-
-Created with EulaIQ - AI-powered educational animation
-"""
-        
-        # Upload
-        yt_video_id, yt_url = upload_to_youtube(
-            youtube_service,
-            video_path,
-            f"[Demo] {video_title}",
-            description
-        )
-        
-        if yt_video_id and yt_url:
-            # Update database
-            db.set_youtube_uploaded(
-                channel_id=channel_id,
-                youtube_video_id=yt_video_id,
-                youtube_url=yt_url,
-                channel_used=yt_channel["channel_id"]
-            )
-            
-            # Update tracker
-            increment_channel_uploads(tracker, yt_channel["channel_id"])
-            
-            uploaded += 1
-            print(f"  ✅ Uploaded: {yt_url}")
+    # Skip leads with nothing to upload
+    uploadable = []
+    for lead in leads:
+        if lead.get("s3_video_url"):
+            uploadable.append(lead)
         else:
-            failed += 1
-            print("  ❌ Upload failed")
-        
-        # Small delay between uploads
-        if i < len(leads):
-            time.sleep(2)
+            print(f"  ⚠️ {lead.get('creator_name', lead['channel_id'])}: No S3 URL found - skipping")
+            stats["failed"] += 1
+    
+    # Only work on leads that can actually be uploaded today
+    if len(uploadable) > remaining_capacity:
+        print(f"⚠️ Only {remaining_capacity} can be uploaded today. {len(uploadable) - remaining_capacity} videos remaining for tomorrow.")
+        uploadable = uploadable[:remaining_capacity]
+    
+    assignments = assign_channels(uploadable, channels, tracker)
+    channels_by_id = {c["channel_id"]: c for c in channels}
+    
+    for yt_channel_id, channel_leads in assignments.items():
+        if not channel_leads:
+            continue
+        name = channels_by_id[yt_channel_id].get('name', yt_channel_id[:8])
+        print(f"  Channel {name}: {len(channel_leads)} videos")
+        for lead in channel_leads:
+            print(f"    - {lead.get('creator_name', lead.get('channel_name', 'Unknown'))}: {lead.get('video_title', 'Unknown Video')}")
+    print()
+    
+    if dry_run:
+        print("[DRY RUN] Would upload the videos above to YouTube")
+        return
+    
+    pending_records = []
+    
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_read=300)) as session:
+            await asyncio.gather(*(
+                upload_channel_queue(session, channels_by_id[yt_channel_id], channel_leads,
+                                     db, tracker, stats, pending_records)
+                for yt_channel_id, channel_leads in assignments.items()
+                if channel_leads
+            ))
+    finally:
+        # Persist any uploads not yet written
+        db.set_youtube_uploaded_bulk(pending_records)
+    
+    uploaded = stats["uploaded"]
     
     print("\n" + "="*50)
     print("Upload Summary:")
     print(f"  ✅ Uploaded: {uploaded}")
-    print(f"  ❌ Failed: {failed}")
+    print(f"  ❌ Failed: {stats['failed']}")
     print(f"  📊 Remaining today: {remaining_capacity - uploaded}")
     
     if uploaded > 0:
@@ -370,6 +528,11 @@ Created with EulaIQ - AI-powered educational animation
         print("  Run: python 4_draft_emails.py")
 
 
+def process_uploads(limit=None, dry_run=False):
+    """Upload approved videos to YouTube."""
+    asyncio.run(process_uploads_async(limit=limit, dry_run=dry_run))
+
+
 def show_upload_status():
     """Show current upload status and capacity."""
     channels = load_youtube_channels()
@@ -13,11 +13,24 @@ Features:
 - Direct editing or reprompting for changes
 - Round-robin sender assignment
 """
+import functools
+import io
 import json
+import orjson
+import os
+import re
 import asyncio
+import subprocess
+import tempfile
+import threading
 import yt_dlp
+from dateutil import parser as date_parser
+from diskcache import Cache
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from difflib import SequenceMatcher
 from pathlib import Path
+from string import Template
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))  # Add scripts/ to path
 
@@ -27,60 +40,386 @@ from aws_bedrock_client import AWSBedrockClient
 # Configuration
 CONTEXT_DIR = Path(__file__).parent.parent.parent / "Context"
 TEMPLATE_FILE = CONTEXT_DIR / "template.txt"
+_TEMPLATE_CACHE = {}  # path -> (mtime, (text, body_template)), see load_template
 
 # Default interval between scheduled emails (minutes)
 DEFAULT_SEND_INTERVAL = 60
 
+# On-disk cache of yt-dlp channel metadata (channel_url -> {'channel_name': ...})
+METADATA_CACHE_DIR = Path(__file__).parent.parent.parent / "data" / "yt_metadata_cache"
+METADATA_CACHE_TTL = 24 * 60 * 60
+_metadata_cache = Cache(str(METADATA_CACHE_DIR))
+_refresh_metadata = False  # Set by --refresh-metadata to bypass cached entries
+
+# Lead fields read when drafting (projection for the status queries)
+DRAFT_FIELDS = [
+    "channel_id", "creator_name", "channel_name", "email", "notes", "notes_log", "draft_email",
+    "video_title", "video_url", "source_video", "final_video_url", "youtube_url", "branded_player_url",
+    "subject_area", "overall_assessment", "local_audio_path"
+]
+
+# Shared Bedrock client (see get_client)
+_client = None
+
+# Batch mode: concurrent LLM calls and per-lead timeout (seconds)
+MAX_CONCURRENT_DRAFTS = 5
+DRAFT_TIMEOUT = 120
+
+# Legacy [Name]-style placeholders, mapped to the {key} that replaces them
+_PLACEHOLDER_RE = re.compile(r'\[(Name|name|Video Title|video title|Link to EulaIQ Render|link|Math/Physics|math/physics)\]')
+_PLACEHOLDER_KEYS = {
+    "Name": "name", "name": "name",
+    "Video Title": "video_title", "video title": "video_title",
+    "Link to EulaIQ Render": "link", "link": "link",
+    "Math/Physics": "subject", "math/physics": "subject",
+}
+
+# Template {subject} label: lead subject_area codes (see 2_refine_leads) and keywords for free text
+SUBJECT_LABELS = {
+    "math": "Math", "physics": "Physics", "chemistry": "Chemistry", "cs": "Computer Science",
+    "engineering": "Engineering", "biology": "Biology", "economics": "Economics",
+}
+SUBJECT_BY_KEYWORD = (
+    ("math", "Math"), ("geometry", "Math"), ("physics", "Physics"), ("chemistry", "Chemistry"),
+    ("computer", "Computer Science"), ("engineering", "Engineering"), ("biology", "Biology"),
+    ("economics", "Economics"),
+)
+DEFAULT_SUBJECT_LABEL = "Math/Physics"
+
+# "Body:" header line in template.txt (any case, text may follow on the same line)
+_BODY_HEADER_RE = re.compile(r'^[ \t]*body[ \t]*:', re.IGNORECASE | re.MULTILINE)
+
+# Creator names that mean "we don't actually know who this is"
+UNKNOWN_CREATOR_NAMES = frozenset({"there", "unknown", "channel", "none", ""})
+
+# Batch mode: leads packed into a single Bedrock prompt
+PROMPT_PACK_SIZE = 5
+DB_WRITE_BATCH = 100  # Drafts per bulk_write
+
+# Interactive reprompts: follow-up generated in the background after each reprompt
+SPECULATIVE_REPROMPT = "make it shorter"
+SPECULATIVE_MATCH_RATIO = 0.8
+
+# Client-side pacing of Bedrock calls (keeps batch mode under the model's quota)
+BEDROCK_REQUESTS_PER_SECOND = 2
+
+
+# First fenced block in an LLM reply
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+# Invariant instruction blocks, sent as the Bedrock system prompt with a cache
+# point so repeated calls reuse the cached prefix instead of re-reading it
+STANDARD_EMAIL_INSTRUCTIONS = """You are writing cold outreach emails to YouTube creators.
+The goal is to sound like a helpful engineer or potential partner, NOT a salesperson.
+The vibe should be: "I made this for you to see if it's useful," similar to how an editor might send a draft to a creator.
+
+SENDER INFO:
+- Name: Victor
+- Title: Founder & CEO, EulaIQ
+
+MANDATORY INSTRUCTIONS:
+1. OPENING: Brief, genuine compliment on their content.
+2. THE "PITCH": Don't pitch. Just say you ran their audio from the video through your animation engine (EulaIQ) to see what it would look like.
+3. THE LINK: Present the creator's personalized video link clearly.
+4. CREDIBILITY: Mention EulaIQ is part of the NVIDIA Inception program naturally (e.g. "We're building this engine as part of the NVIDIA Inception program...").
+5. VALUE PROP: Focus on "automating the tedious parts" or "going from script to video in minutes".
+6. CALL TO ACTION: Ask if they want a login to try it or a quick demo.
+7. LENGTH: Keep it short. Under 130 words.
+8. FORMATTING: Use double newlines (\\n\\n) between paragraphs to ensure readability.
+
+Important: Write ONLY the paragraphs between the greeting and the sign-off. The subject line,
+the "Hi <name>," greeting and the signature are added automatically - do not include them."""
+
+PERMISSION_EMAIL_INSTRUCTIONS = """You are writing cold outreach emails to YouTube creators.
+The goal is to ask for PERMISSION to create a demo video for them. We have NOT created it yet.
+
+SENDER INFO:
+- Name: Victor
+- Title: Founder & CEO, EulaIQ
+
+MANDATORY INSTRUCTIONS:
+1. OPENING: Compliment their content specifically (use the notes if available).
+2. INTRO: Briefly explain EulaIQ (AI animation engine for math/science) and mention we are part of the NVIDIA Inception program.
+3. THE ASK: Explicitly ask for permission to use the audio from their video to create a custom animation demo for them.
+4. CALL TO ACTION: Ask them to reply "yes" if they are interested in seeing the demo.
+5. LENGTH: Keep it short. Under 130 words.
+6. FORMATTING: Use double newlines (\\n\\n) between paragraphs.
+
+Important: Write ONLY the paragraphs between the greeting and the sign-off. The subject line,
+the "Hi <name>," greeting and the signature are added automatically - do not include them."""
+
+EMAIL_SIGNATURE = "Best,\nVictor\nFounder & CEO, EulaIQ"
+
+# Per-lead user prompts, parsed once and filled with Template.substitute
+PERMISSION_PROMPT_TMPL = Template("""CREATOR INFO:
+- Name: $creator_name
+- Channel: $channel_name
+- Video we want to animate: "$video_title"
+- Subject area: $subject_area
+
+SPECIAL NOTES (Use for compliment):
+$notes
+
+Respond with JSON only:
+{
+    "body": "The email paragraphs, separated by \\n\\n"
+}""")
+
+STANDARD_PROMPT_TMPL = Template("""CREATOR INFO:
+- Name: $creator_name
+- Channel: $channel_name
+- Video we animated: "$video_title"
+- Subject area: $subject_area
+- Assessment: $overall_assessment
+
+PERSONALIZED VIDEO LINK:
+$branded_url
+
+SPECIAL CONTEXT:
+$special_context
+
+SPECIAL NOTES/INSTRUCTIONS:
+$notes
+
+Respond with JSON only:
+{
+    "body": "The email paragraphs, separated by \\n\\n"
+}""")
+
+LOCAL_AUDIO_CONTEXT = (
+    "This video was generated using a LOCAL AUDIO file (AI-generated lecture based on their content). "
+    "You MUST explain this clearly: we created a conceptual demonstration using an AI voice/lecture derived "
+    "from their work to demonstrate the strengths of our animation engine and show them what's possible."
+)
+
+
+def merge_notes(lead):
+    """
+    The lead's notes: the legacy `notes` field (a string, or a list from older imports) plus
+    the texts appended to `notes_log` by `manage_leads.py note`, oldest first.
+    """
+    notes = lead.get("notes") or ""
+    log = [entry["text"] for entry in lead.get("notes_log") or [] if entry.get("text")]
+    if not log:
+        return notes
+    legacy = [str(n).strip() for n in notes if n] if isinstance(notes, list) else [notes.strip()] if notes.strip() else []
+    return "\n".join(legacy + log)
+
+
+@dataclass(slots=True)
+class LeadView:
+    """Lead fields used for drafting and display, resolved once per lead."""
+    channel_id: str
+    creator_name: str       # creator_name, else channel_name ("" if unknown)
+    channel_name: str
+    video_title: str        # lead title, else source video title ("" if unknown)
+    final_link: str         # best public link: final URL, YouTube URL, then branded player
+    branded_url: str
+    source_url: str
+    notes: object
+    subject_area: str
+    overall_assessment: str
+    local_audio_path: str
+
+    @classmethod
+    def from_lead(cls, lead):
+        source_video = lead.get("source_video") or {}
+        return cls(
+            channel_id=lead["channel_id"],
+            creator_name=lead.get("creator_name") or lead.get("channel_name") or "",
+            channel_name=lead.get("channel_name") or "",
+            video_title=lead.get("video_title") or source_video.get("title") or "",
+            final_link=lead.get("final_video_url") or lead.get("youtube_url") or lead.get("branded_player_url") or "",
+            branded_url=lead.get("branded_player_url") or "",
+            source_url=lead.get("video_url") or source_video.get("video_url") or source_video.get("url") or "",
+            notes=merge_notes(lead),
+            subject_area=lead.get("subject_area") or "educational content",
+            overall_assessment=lead.get("overall_assessment") or "",
+            local_audio_path=lead.get("local_audio_path") or "",
+        )
+
+
+def get_client():
+    """Return the process-wide Bedrock client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = AWSBedrockClient(requests_per_second=BEDROCK_REQUESTS_PER_SECOND, keep_alive=True)
+    return _client
+
+
+def email_subject(video_title, permission_mode=False):
+    """Fixed subject line for an outreach email."""
+    if permission_mode:
+        return f"{video_title} - Animation Demo?"
+    return f"{video_title} - Animation Draft"
+
+
+def compose_email_body(creator_name, paragraphs):
+    """Wrap LLM-written paragraphs with the greeting and signature."""
+    return f"Hi {creator_name},\n\n{paragraphs.strip()}\n\n{EMAIL_SIGNATURE}"
+
+
+def strip_code_fence(text):
+    """Return the contents of the first ``` / ```json fenced block, or the text unchanged."""
+    match = _FENCE_RE.search(text)
+    return match.group(1) if match else text
+
+
+def parse_llm_json(text):
+    """Parse JSON from an LLM reply with orjson, falling back to the more lenient stdlib parser."""
+    text = text.strip()
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return json.loads(text)
+
 
 def fetch_channel_metadata(channel_url):
-    """Fetch channel name from URL using yt-dlp."""
+    """Fetch channel name from URL using yt-dlp (cached on disk for 24h)."""
+    if _refresh_metadata:
+        _metadata_cache.delete(channel_url)
+    else:
+        cached = _metadata_cache.get(channel_url)
+        if cached is not None:
+            return cached
+    
     try:
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
             'skip_download': True,
-            'extract_flat': True
+            'extract_flat': 'in_playlist',
+            # Only channel-level fields are needed: skip manifests and player JS
+            'youtube_include_dash_manifest': False,
+            'extractor_args': {'youtube': {'player_skip': ['configs', 'webpage']}}
         }
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(channel_url, download=False)
-            return {
-                'channel_name': info.get('uploader') or info.get('title'),
+            # process=False returns the raw channel info without resolving entries
+            info = ydl.extract_info(channel_url, download=False, process=False)
+            metadata = {
+                'channel_name': info.get('uploader') or info.get('channel') or info.get('title'),
             }
+        _metadata_cache.set(channel_url, metadata, expire=METADATA_CACHE_TTL)
+        return metadata
     except Exception as e:
         print(f"    ⚠️ Could not fetch channel metadata: {e}")
         return None
 
 
 def load_template():
-    """Load email template as reference for LLM."""
+    """
+    Load the email template: (raw text for the LLM reference, compiled body template).
+    Parsed once and cached until template.txt changes on disk. Returns (None, None) if missing.
+    """
     try:
-        with open(TEMPLATE_FILE, "r", encoding="utf-8") as f:
-            return f.read()
+        mtime = TEMPLATE_FILE.stat().st_mtime
     except FileNotFoundError:
         print(f"⚠️ Template file not found: {TEMPLATE_FILE}")
+        return None, None
+    
+    cached = _TEMPLATE_CACHE.get(TEMPLATE_FILE)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    
+    with open(TEMPLATE_FILE, "r", encoding="utf-8") as f:
+        text = f.read()
+    template = (text, compile_template(text))
+    _TEMPLATE_CACHE[TEMPLATE_FILE] = (mtime, template)
+    return template
+
+
+class _SafeDict(dict):
+    """format_map mapping that leaves unknown {placeholders} in place."""
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def compile_template(text):
+    """
+    Return the template's Body section as a str.format_map template ({name}, {video_title},
+    {link}, {subject}). Legacy [Name]-style placeholders are converted here, once per load.
+    Returns None if the template has no Body section.
+    """
+    header = _BODY_HEADER_RE.search(text)
+    if not header:
         return None
+    body = text[header.end():].strip()
+    return _PLACEHOLDER_RE.sub(lambda m: "{" + _PLACEHOLDER_KEYS[m.group(1)] + "}", body)
+
 
+def fill_template(body_template, values):
+    """Render a compiled template with {key: value} for its placeholders."""
+    return body_template.format_map(_SafeDict(values))
 
-async def generate_email_with_llm(client, lead, template_reference, permission_mode=False):
+
+@functools.lru_cache(maxsize=128)
+def subject_label(subject_area):
+    """Display label for a lead's subject area (memoized: most leads share a handful of values)."""
+    key = subject_area.strip().lower()
+    if key in SUBJECT_LABELS:
+        return SUBJECT_LABELS[key]
+    return next((label for keyword, label in SUBJECT_BY_KEYWORD if keyword in key), DEFAULT_SUBJECT_LABEL)
+
+
+def fallback_email(creator_name, video_title, link, subject_area, body_template=None):
+    """Draft used when the LLM returns nothing: the filled template, or a short generic note."""
+    subject = f"{video_title} - Animation Draft"
+    if body_template:
+        body = fill_template(body_template, {
+            "name": creator_name,
+            "video_title": video_title,
+            "link": link,
+            "subject": subject_label(subject_area),
+        })
+    else:
+        body = f"Hi {creator_name},\n\nI created an animation for your video.\n\nCheck it out: {link}\n\nBest,\nVictor"
+    return subject, body
+
+
+def edit_email_in_editor(subject, body):
     """
-    Generate personalized email using LLM.
-    Uses lead data, notes field, and template as guidance.
+    Open the draft in $EDITOR (first line = subject, blank line, then body).
+    Returns (subject, body), or None if the editor could not be launched.
     """
-    source_video = lead.get("source_video", {})
-    video_title = lead.get("video_title") or source_video.get("title", "your video")
-    creator_name = lead.get("creator_name", lead.get("channel_name", "there"))
+    editor = os.environ.get("VISUAL") or os.environ.get("EDITOR") or ("notepad" if os.name == "nt" else "vi")
+    
+    # delete=False so the editor can reopen the file on Windows
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as tmp:
+        tmp.write(f"{subject}\n\n{body}\n")
+        tmp_path = tmp.name
     
-    # Check for local audio
-    local_audio_path = lead.get("local_audio_path")
-    is_local_audio = bool(local_audio_path)
+    try:
+        subprocess.run([*editor.split(), tmp_path], check=True)
+        with open(tmp_path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"  ⚠️ Could not open editor '{editor}': {e}")
+        return None
+    finally:
+        os.unlink(tmp_path)
     
-    # Fetch metadata if needed (unknown creator)
-    if not creator_name or creator_name.lower() in ["there", "unknown", "channel", "none"]:
+    new_subject, _, new_body = text.partition("\n")
+    return new_subject.strip() or subject, new_body.strip("\n") or body
+
+
+def resolve_creator_name(lead, creator_name, quiet=False):
+    """
+    Look up the channel name with yt-dlp when the lead's creator name is unknown.
+    Saves the discovered name to the DB and returns it (or the original name).
+    The lookup runs at most once per lead dict, so reprompts never re-enter yt-dlp.
+    quiet suppresses progress output (background prefetch runs while a prompt is open).
+    """
+    if lead.get('_meta_resolved'):
+        return lead.get('creator_name') or creator_name
+    if not creator_name or creator_name.lower() in UNKNOWN_CREATOR_NAMES:
+        lead['_meta_resolved'] = True
         channel_url = f"https://www.youtube.com/channel/{lead['channel_id']}"
-        print(f"    Fetching metadata for {channel_url}...")
+        if not quiet:
+            print(f"    Fetching metadata for {channel_url}...")
         metadata = fetch_channel_metadata(channel_url)
         if metadata and metadata.get('channel_name'):
             creator_name = metadata['channel_name']
+            lead['creator_name'] = creator_name
             # Update DB with the discovered metadata so future steps have accurate names
             try:
                 db = get_db()
@@ -88,111 +427,72 @@ async def generate_email_with_llm(client, lead, template_reference, permission_m
                     'creator_name': metadata.get('channel_name'),
                     'channel_name': metadata.get('channel_name')
                 })
-                print(f"    ✅ Channel metadata saved to DB for {lead['channel_id']}")
+                if not quiet:
+                    print(f"    ✅ Channel metadata saved to DB for {lead['channel_id']}")
             except Exception as e:
                 print(f"    ⚠️ Could not update channel metadata in DB: {e}")
+    return creator_name
+
+
+async def generate_email_with_llm(client, lead, template_reference, permission_mode=False, view=None, quiet=False):
+    """
+    Generate personalized email using LLM.
+    Uses lead data, notes field, and template as guidance.
+    """
+    view = view or LeadView.from_lead(lead)
+    video_title = view.video_title or "your video"
+    is_local_audio = bool(view.local_audio_path)
+    
+    # Fetch metadata if needed (unknown creator); yt-dlp and the DB write run off the event loop
+    creator_name = await asyncio.to_thread(resolve_creator_name, lead, view.creator_name, quiet)
+    view.creator_name = creator_name
 
-    notes = lead.get("notes", "")
+    notes = view.notes
     # Prefer final/public video links if present (uploaded YouTube URL or final URL), then branded player
-    branded_url = lead.get("final_video_url") or lead.get("youtube_url") or lead.get("branded_player_url") or "[VIDEO_LINK]"
+    branded_url = view.final_link or "[VIDEO_LINK]"
     
     # Get channel info
-    channel_name = lead.get("channel_name", "")
-    overall_assessment = lead.get("overall_assessment", "")
-    subject_area = lead.get("subject_area", "educational content")
+    channel_name = view.channel_name
+    overall_assessment = view.overall_assessment
+    subject_area = view.subject_area
     
     if permission_mode:
         # PERMISSION MODE PROMPT
-        prompt = f"""You are writing a cold outreach email to a YouTube creator.
-The goal is to ask for PERMISSION to create a demo video for them. We have NOT created it yet.
-
-SENDER INFO:
-- Name: Victor
-- Title: Founder & CEO, EulaIQ
-
-CREATOR INFO:
-- Name: {creator_name}
-- Channel: {channel_name}
-- Video we want to animate: "{video_title}"
-- Subject area: {subject_area}
-
-SPECIAL NOTES (Use for compliment):
-{notes if notes else "No special notes."}
-
-MANDATORY INSTRUCTIONS:
-1. SUBJECT LINE: "{video_title} - Animation Demo?"
-2. OPENING: Compliment their content specifically (use the notes if available).
-3. INTRO: Briefly explain EulaIQ (AI animation engine for math/science) and mention we are part of the NVIDIA Inception program.
-4. THE ASK: Explicitly ask for permission to use the audio from their video "{video_title}" to create a custom animation demo for them.
-5. CALL TO ACTION: Ask them to reply "yes" if they are interested in seeing the demo.
-6. LENGTH: Keep it short. Under 150 words.
-7. SIGNATURE: Sign off as "Victor\\nFounder & CEO, EulaIQ".
-8. FORMATTING: Use double newlines (\\n\\n) between paragraphs.
-
-Respond with JSON only:
-{{
-    "subject": "Email subject line",
-    "body": "Full email body with proper formatting and line breaks"
-}}"""
+        system = PERMISSION_EMAIL_INSTRUCTIONS
+        prompt = PERMISSION_PROMPT_TMPL.substitute(
+            creator_name=creator_name,
+            channel_name=channel_name,
+            video_title=video_title,
+            subject_area=subject_area,
+            notes=notes if notes else "No special notes."
+        )
 
     else:
         # STANDARD MODE PROMPT (Video already created)
-        prompt = f"""You are writing a cold outreach email to a YouTube creator.
-The goal is to sound like a helpful engineer or potential partner, NOT a salesperson.
-The vibe should be: "I made this for you to see if it's useful," similar to how an editor might send a draft to a creator.
-
-SENDER INFO:
-- Name: Victor
-- Title: Founder & CEO, EulaIQ
-
-CREATOR INFO:
-- Name: {creator_name}
-- Channel: {channel_name}
-- Video we animated: "{video_title}"
-- Subject area: {subject_area}
-- Assessment: {overall_assessment}
-
-PERSONALIZED VIDEO LINK:
-{branded_url}
-
-SPECIAL CONTEXT:
-{ "This video was generated using a LOCAL AUDIO file (AI-generated lecture based on their content). You MUST explain this clearly: we created a conceptual demonstration using an AI voice/lecture derived from their work to demonstrate the strengths of our animation engine and show them what's possible." if is_local_audio else "" }
-
-SPECIAL NOTES/INSTRUCTIONS:
-{notes if notes else "No special notes."}
-
-MANDATORY INSTRUCTIONS:
-1. SUBJECT LINE: Must be exactly "{video_title} - Animation Draft" (or very similar, e.g. "Animation Draft: {video_title}"). Do not use "catchy" marketing subjects.
-2. OPENING: Brief, genuine compliment on their content.
-3. THE "PITCH": Don't pitch. Just say you ran their audio from "{video_title}" through your animation engine (EulaIQ) to see what it would look like.
-4. THE LINK: Present the link clearly.
-5. CREDIBILITY: Mention EulaIQ is part of the NVIDIA Inception program naturally (e.g. "We're building this engine as part of the NVIDIA Inception program...").
-6. VALUE PROP: Focus on "automating the tedious parts" or "going from script to video in minutes".
-7. CALL TO ACTION: Ask if they want a login to try it or a quick demo.
-8. LENGTH: Keep it short. Under 150 words.
-9. SIGNATURE: Sign off as "Victor\\nFounder & CEO, EulaIQ". Do NOT use placeholders like "[Your Name]".
-10. FORMATTING: Use double newlines (\\n\\n) between paragraphs to ensure readability.
-
-Respond with JSON only:
-{{
-    "subject": "Email subject line",
-    "body": "Full email body with proper formatting and line breaks"
-}}
-
-Important: The body should be ready to send - proper greeting, content, signature. Use \\n for line breaks."""
+        system = STANDARD_EMAIL_INSTRUCTIONS
+        prompt = STANDARD_PROMPT_TMPL.substitute(
+            creator_name=creator_name,
+            channel_name=channel_name,
+            video_title=video_title,
+            subject_area=subject_area,
+            overall_assessment=overall_assessment,
+            branded_url=branded_url,
+            special_context=LOCAL_AUDIO_CONTEXT if is_local_audio else "",
+            notes=notes if notes else "No special notes."
+        )
 
     try:
-        response = await client.converse(prompt)
+        response = await client.converse(prompt, system=system, cache_system=True)
         text = response.get("text", "")
         
         # Clean up potential markdown
-        if "```json" in text:
-            text = text.split("```json")[1].split("```")[0]
-        elif "```" in text:
-            text = text.split("```")[1].split("```")[0]
+        text = strip_code_fence(text)
         
-        result = json.loads(text.strip())
-        return result.get("subject", ""), result.get("body", "")
+        result = parse_llm_json(text)
+        paragraphs = result.get("body", "")
+        if not paragraphs:
+            return None, None
+        return email_subject(video_title, permission_mode), compose_email_body(creator_name, paragraphs)
     except Exception as e:
         print(f"    ⚠️ LLM email generation failed: {e}")
         return None, None
@@ -231,12 +531,10 @@ Respond with JSON only:
         response = await client.converse(prompt)
         text = response.get("text", "")
         
-        if "```json" in text:
-            text = text.split("```json")[1].split("```")[0]
-        elif "```" in text:
-            text = text.split("```")[1].split("```")[0]
+        # Clean up potential markdown
+        text = strip_code_fence(text)
         
-        result = json.loads(text.strip())
+        result = parse_llm_json(text)
         return result.get("subject", current_subject), result.get("body", current_body)
     except Exception as e:
         print(f"    ⚠️ Reprompt failed: {e}")
@@ -248,8 +546,38 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
     Interactive mode: Generate and review emails one by one.
     Approve with scheduled time, modify, reprompt, or skip.
     """
+    # One event loop for the whole session, running in the background so the
+    # next lead's draft keeps generating while the user reviews the current one
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+    try:
+        _interactive_review(loop, target_channel_id, permission_mode)
+    finally:
+        asyncio.run_coroutine_threadsafe(get_client().close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+        loop.close()
+
+
+def _interactive_review(loop, target_channel_id, permission_mode):
+    """Review loop for interactive_draft_and_schedule, running LLM calls on `loop`."""
     db = get_db()
     
+    def run(coro):
+        """Run a coroutine on the background loop and wait for the result."""
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+    
+    def prefetch(lead, view):
+        """Start generating a lead's draft in the background (None if it already has one)."""
+        # quiet: the draft is built while the previous lead's Action prompt is waiting for input
+        existing = lead.get("draft_email") or {}
+        if existing.get("subject") and existing.get("body"):
+            return None
+        return asyncio.run_coroutine_threadsafe(
+            generate_email_with_llm(client, lead, template, permission_mode=permission_mode, view=view, quiet=True), loop
+        )
+    
     if target_channel_id:
         lead = db.get_lead_by_channel(target_channel_id)
         if not lead:
@@ -261,11 +589,11 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
         if permission_mode:
             # In permission mode, we want leads that are APPROVED (reviewed & have email) but not yet processed/uploaded
             # We look for leads in APPROVED status
-            leads = list(db.get_leads_by_status(LeadStatus.APPROVED))
+            leads = db.get_leads_by_status(LeadStatus.APPROVED, DRAFT_FIELDS)
             print(f"Found {len(leads)} APPROVED leads for permission request.")
         else:
             # Get leads that were uploaded (final videos available) so we can draft emails
-            leads = list(db.get_leads_by_status(LeadStatus.UPLOADED))
+            leads = db.get_leads_by_status(LeadStatus.UPLOADED, DRAFT_FIELDS)
     
     if not leads:
         if permission_mode:
@@ -287,10 +615,13 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
     print("  [q]uit     - Exit\n")
     
     # Load template for LLM reference
-    template = load_template()
+    template, body_template = load_template()
+    # The template pitches a finished render, so it only backs up standard-mode drafts
+    if permission_mode:
+        body_template = None
     
     # Initialize LLM client
-    client = AWSBedrockClient()
+    client = get_client()
     if not client.is_enabled():
         print("⚠️ Bedrock client is in MOCK mode - emails will use template fallback.\n")
     
@@ -300,24 +631,25 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
     # Track scheduled times for round-robin
     scheduled_times = {}  # sender_id -> next available time
     
-    for i, lead in enumerate(leads, 1):
-        channel_id = lead["channel_id"]
-        creator_name = lead.get("creator_name", lead.get("channel_name", "Unknown"))
-        video_title = lead.get("video_title", "Unknown")
+    views = [LeadView.from_lead(lead) for lead in leads]
+    next_draft = prefetch(leads[0], views[0])
+    
+    for i, (lead, view) in enumerate(zip(leads, views), 1):
+        # Start the following lead's draft before the user starts reviewing this one
+        current_draft = next_draft
+        next_draft = prefetch(leads[i], views[i]) if i < len(leads) else None
+        
+        channel_id = view.channel_id
+        creator_name = view.creator_name or "Unknown"
+        video_title = view.video_title or "Unknown"
         email_addr = lead.get("email", "")
-        notes = lead.get("notes", "")
-        branded_url = lead.get("branded_player_url", "")
+        notes = view.notes
+        final_link = view.final_link
         
         print("="*60)
         print(f"[{i}/{len(leads)}] {creator_name}")
         print(f"  Email: {email_addr}")
-        # Determine and show video title
-        vt = video_title or "Unknown"
-        source_video = lead.get("source_video", {})
-        local_audio_path = lead.get("local_audio_path")
-        # Prefer final/public URLs for display
-        final_link = lead.get("final_video_url") or lead.get("youtube_url") or lead.get("branded_player_url") or ""
-        print(f"  Video: {vt}")
+        print(f"  Video: {video_title}")
         
         if not permission_mode:
             # Show final video URL if present (branded/youtube/final) and source video URL if different
@@ -329,12 +661,11 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
                 print(f"  Video URL: {trunc(final_link)}")
             else:
                 print("  Video URL: NOT SET")
-            source_display = lead.get("video_url") or source_video.get("video_url") or source_video.get("url")
-            if source_display and source_display != branded_url:
-                print(f"  Source URL: {trunc(source_display)}")
+            if view.source_url and view.source_url != view.branded_url:
+                print(f"  Source URL: {trunc(view.source_url)}")
 
-            if local_audio_path:
-                print(f"  🎵 Local Audio: {local_audio_path}")
+            if view.local_audio_path:
+                print(f"  🎵 Local Audio: {view.local_audio_path}")
 
         # Normalize notes display
         if not notes:
@@ -357,12 +688,14 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
         else:
             # Generate email using LLM
             print("  🤖 Generating personalized email...")
-            subject, body = asyncio.run(generate_email_with_llm(client, lead, template, permission_mode=permission_mode))
+            subject, body = current_draft.result()
         
         if not subject or not body:
             print("  ⚠️ Email generation failed, using fallback template")
-            subject = f"{video_title} - Animation Draft"
-            body = f"Hi {creator_name},\n\nI created an animation for your video.\n\nCheck it out: {final_link or '[LINK]'}\n\nBest,\nVictor"
+            subject, body = fallback_email(creator_name, video_title, final_link or "[LINK]", view.subject_area, body_template)
+        
+        # Background reprompt of the current draft, reused if the user asks for it next
+        speculative = None  # (request, subject, body, future)
         
         # Review loop
         while True:
@@ -375,12 +708,18 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
             action = input("\nAction [a/e/r/n/m/s/q]: ").lower().strip()
             
             if action == 'q':
+                if next_draft:
+                    next_draft.cancel()
+                if speculative:
+                    speculative[3].cancel()
                 print(f"\n✅ Approved: {approved}, ⏭️ Skipped: {skipped}")
                 return
             
             if action == 's':
                 print("  ⏭️ Skipped")
                 skipped += 1
+                if speculative:
+                    speculative[3].cancel()
                 break
             
             if action == 'm':
@@ -394,17 +733,23 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
                 continue
 
             if action == 'e':
-                # Direct edit
+                # Direct edit in $EDITOR, falling back to line-by-line input without a terminal
+                edited = edit_email_in_editor(subject, body) if sys.stdin.isatty() else None
+                if edited:
+                    subject, body = edited
+                    print("  ✅ Email updated")
+                    continue
+                
                 print("\n  📝 Enter new subject (or press Enter to keep current):")
                 new_subject = input("  Subject: ").strip()
                 if new_subject:
                     subject = new_subject
                 
-                print("  📝 Enter new body (type 'END' on a new line when done):")
+                print("  📝 Enter new body (type 'END' on a new line or send EOF when done):")
                 print("  (Press Enter twice then type END to finish)")
                 lines = []
-                while True:
-                    line = input()
+                for line in iter(sys.stdin.readline, ''):
+                    line = line.rstrip('\r\n')
                     if line.strip().upper() == 'END':
                         break
                     lines.append(line)
@@ -418,9 +763,21 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
                 print("  📝 What changes would you like? (e.g., 'make it shorter', 'add humor'):")
                 modification = input("  Request: ").strip()
                 if modification:
-                    print("  🤖 Regenerating...")
-                    subject, body = asyncio.run(reprompt_email(client, subject, body, modification, creator_name=creator_name))
+                    if (speculative and speculative[1:3] == (subject, body)
+                            and SequenceMatcher(None, modification.lower(), speculative[0]).ratio() > SPECULATIVE_MATCH_RATIO):
+                        print("  ⚡ Using pre-generated variant...")
+                        subject, body = speculative[3].result()
+                    else:
+                        if speculative:
+                            speculative[3].cancel()
+                        print("  🤖 Regenerating...")
+                        subject, body = run(reprompt_email(client, subject, body, modification, creator_name=creator_name))
                     print("  ✅ Email regenerated")
+                    
+                    # Users often iterate; prepare the most common follow-up while they read
+                    speculative = (SPECULATIVE_REPROMPT, subject, body, asyncio.run_coroutine_threadsafe(
+                        reprompt_email(client, subject, body, SPECULATIVE_REPROMPT, creator_name=creator_name), loop
+                    ))
                 continue
             
             if action == 'n':
@@ -429,7 +786,7 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
                 if new_name:
                     db.update_lead_by_channel(channel_id, {"creator_name": new_name})
                     lead["creator_name"] = new_name
-                    creator_name = new_name
+                    view.creator_name = creator_name = new_name
                     print(f"  ✅ Creator name updated to: {new_name}")
                     print("  💡 Tip: Use [r]eprompt to regenerate the email with the new name.")
                 continue
@@ -451,7 +808,6 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
                     except ValueError:
                         # Try parsing as datetime
                         try:
-                            from dateutil import parser as date_parser
                             scheduled_time = date_parser.parse(time_input)
                         except:
                             print("  ⚠️ Invalid time format, using default")
@@ -460,21 +816,18 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
                     # Default: increment from last scheduled
                     scheduled_time = datetime.now() + timedelta(minutes=DEFAULT_SEND_INTERVAL * (approved + 1))
                 
-                # Save draft to database
-                db.set_draft_email(
+                # Save draft and scheduled time to database
+                db.finalize_draft(
                     channel_id=channel_id,
                     subject=subject,
-                    body=body
+                    body=body,
+                    scheduled_send_time=scheduled_time
                 )
                 
-                # Update with scheduled time
-                db.update_lead_by_channel(channel_id, {
-                    "scheduled_send_time": scheduled_time,
-                    "status": LeadStatus.DRAFTED
-                })
-                
                 approved += 1
                 print(f"  ✅ Approved! Scheduled for: {scheduled_time.strftime('%Y-%m-%d %H:%M')}")
+                if speculative:
+                    speculative[3].cancel()
                 break
             
             print("  Invalid action. Use: a=approve, e=edit, r=reprompt, s=skip, q=quit")
@@ -489,6 +842,106 @@ def interactive_draft_and_schedule(target_channel_id=None, permission_mode=False
     print("  3. Dispatch: python 5_dispatch_emails.py --email 1 --date now")
 
 
+async def generate_emails_batch(client, leads_chunk, template_reference):
+    """
+    Generate emails for several leads with one LLM call (standard mode).
+    Returns {channel_id: (subject, body)} for every lead the model answered.
+    """
+    lead_blocks = []
+    headers = {}  # channel_id -> (video_title, creator_name)
+    views = [LeadView.from_lead(lead) for lead in leads_chunk]
+    # Unknown creator names are looked up with yt-dlp (seconds each): in threads, all at once,
+    # so other chunks' Bedrock calls keep running meanwhile
+    creator_names = await asyncio.gather(*(
+        asyncio.to_thread(resolve_creator_name, lead, view.creator_name)
+        for lead, view in zip(leads_chunk, views)
+    ))
+    for n, (lead, view, creator_name) in enumerate(zip(leads_chunk, views, creator_names), 1):
+        video_title = view.video_title or "your video"
+        view.creator_name = creator_name
+        headers[view.channel_id] = (video_title, creator_name)
+        local_audio_note = (
+            "\n- Local audio: YES. This video was generated from an AI-generated lecture based on their content; "
+            "explain clearly that it is a conceptual demonstration of our animation engine."
+            if view.local_audio_path else ""
+        )
+        lead_blocks.append(f"""LEAD {n}:
+- channel_id: {view.channel_id}
+- Name: {creator_name}
+- Channel: {view.channel_name}
+- Video we animated: "{video_title}"
+- Subject area: {view.subject_area}
+- Assessment: {view.overall_assessment}
+- Personalized video link: {view.final_link or "[VIDEO_LINK]"}{local_audio_note}
+- Special notes/instructions: {view.notes if view.notes else "No special notes."}""")
+    
+    leads_text = "\n\n".join(lead_blocks)
+    prompt = f"""Write one email for each of these {len(leads_chunk)} creators.
+
+{leads_text}
+
+Respond with a JSON array only, one object per lead, in the same order:
+[
+    {{"channel_id": "channel_id from the lead", "body": "The email paragraphs, separated by \\n\\n"}}
+]"""
+
+    try:
+        response = await client.converse(prompt, system=STANDARD_EMAIL_INSTRUCTIONS, cache_system=True)
+        text = response.get("text", "")
+        
+        # Clean up potential markdown
+        text = strip_code_fence(text)
+        
+        results = parse_llm_json(text)
+        drafts = {}
+        for r in results:
+            if not isinstance(r, dict) or r.get("channel_id") not in headers or not r.get("body"):
+                continue
+            video_title, creator_name = headers[r["channel_id"]]
+            drafts[r["channel_id"]] = (email_subject(video_title), compose_email_body(creator_name, r["body"]))
+        return drafts
+    except Exception as e:
+        print(f"    ⚠️ Batched LLM generation failed: {e}")
+        return {}
+
+
+async def _draft_chunk(client, chunk, template, sem):
+    """Draft one packed chunk; leads the model missed are retried one by one."""
+    async with sem:
+        try:
+            drafts = await asyncio.wait_for(generate_emails_batch(client, chunk, template), timeout=DRAFT_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"    ⚠️ LLM timed out for a batch of {len(chunk)} leads")
+            drafts = {}
+    
+    results = []
+    for lead in chunk:
+        subject, body = drafts.get(lead["channel_id"], (None, None))
+        if not subject or not body:
+            async with sem:
+                try:
+                    subject, body = await asyncio.wait_for(generate_email_with_llm(client, lead, template), timeout=DRAFT_TIMEOUT)
+                except asyncio.TimeoutError:
+                    print(f"    ⚠️ LLM timed out for {lead['channel_id']}")
+                    subject, body = None, None
+        results.append((subject, body))
+    return results
+
+
+async def _draft_all(client, leads, template):
+    """
+    Generate drafts for all leads, PROMPT_PACK_SIZE leads per LLM call,
+    with up to MAX_CONCURRENT_DRAFTS calls in flight. Results are in lead order.
+    """
+    sem = asyncio.Semaphore(MAX_CONCURRENT_DRAFTS)
+    chunks = [leads[i:i + PROMPT_PACK_SIZE] for i in range(0, len(leads), PROMPT_PACK_SIZE)]
+    try:
+        chunk_results = await asyncio.gather(*(_draft_chunk(client, chunk, template, sem) for chunk in chunks))
+    finally:
+        await client.close()
+    return [draft for chunk in chunk_results for draft in chunk]
+
+
 def draft_emails_batch(limit=None):
     """
     Batch mode: Generate emails without interactive review.
@@ -496,43 +949,58 @@ def draft_emails_batch(limit=None):
     """
     db = get_db()
     
-    template = load_template()
-    client = AWSBedrockClient()
+    template, body_template = load_template()
+    client = get_client()
     
-    leads = list(db.get_leads_by_status(LeadStatus.UPLOADED))
+    # Only pull the leads we'll actually draft (indexed find on status)
+    leads = db.get_leads_by_status(LeadStatus.UPLOADED, DRAFT_FIELDS, limit=limit)
     
     if not leads:
         print("No uploaded leads pending email drafts.")
         print("Run 3b_generate_videos.py, 3c_accept_videos.py, and 3d_upload_youtube.py (or ensure the final video URL is set) first.")
         return
     
-    if limit:
-        leads = leads[:limit]
+    if limit and len(leads) == limit:
+        print(f"Found {len(leads)} leads to draft emails for ({db.count_by_status(LeadStatus.UPLOADED)} uploaded in total).")
+    else:
+        print(f"Found {len(leads)} leads to draft emails for.")
+    print(f"Generating drafts ({PROMPT_PACK_SIZE} leads per prompt, {MAX_CONCURRENT_DRAFTS} prompts at a time)...\n")
     
-    print(f"Found {len(leads)} leads to draft emails for.\n")
+    results = asyncio.run(_draft_all(client, leads, template))
     
     drafted_count = 0
+    pending_drafts = []
+    # Progress lines are buffered and written with each bulk_write, so "saved" means saved
+    out = io.StringIO()
+    
+    def flush_drafts():
+        db.set_draft_emails_bulk(pending_drafts)
+        pending_drafts.clear()
+        sys.stdout.write(out.getvalue())
+        sys.stdout.flush()
+        out.seek(0)
+        out.truncate()
     
-    for i, lead in enumerate(leads, 1):
+    for i, (lead, (subject, body)) in enumerate(zip(leads, results), 1):
         creator = lead.get("creator_name", lead.get("channel_name", "Unknown"))
         channel_id = lead["channel_id"]
         
-        print(f"[{i}/{len(leads)}] Drafting for: {creator}...")
-        
-        subject, body = asyncio.run(generate_email_with_llm(client, lead, template))
+        out.write(f"[{i}/{len(leads)}] {creator}\n")
         
         if not subject or not body:
-            # Fallback to simple template
-            source_video = lead.get("source_video", {})
-            video_title = lead.get("video_title") or source_video.get("title", "your video")
+            # Fallback to the email template
+            view = LeadView.from_lead(lead)
             # Prefer final or public URLs for email link
-            branded_url = lead.get("final_video_url") or lead.get("youtube_url") or lead.get("branded_player_url") or "[LINK]"
-            subject = f"{video_title} - Animation Draft"
-            body = f"Hi {creator},\n\nI created an animation for your video.\n\nCheck it out: {branded_url}\n\nBest,\nVictor"
+            subject, body = fallback_email(creator, view.video_title or "your video", view.final_link or "[LINK]",
+                                           view.subject_area, body_template)
         
-        db.set_draft_email(channel_id=channel_id, subject=subject, body=body)
-        print(f"  ✅ Draft saved: \"{subject[:50]}...\"")
+        pending_drafts.append({"channel_id": channel_id, "subject": subject, "body": body})
+        out.write(f"  ✅ Draft saved: \"{subject[:50]}...\"\n")
         drafted_count += 1
+        if len(pending_drafts) >= DB_WRITE_BATCH:
+            flush_drafts()
+    
+    flush_drafts()
     
     print("\n" + "="*50)
     print("Drafting Complete!")
@@ -553,8 +1021,11 @@ if __name__ == "__main__":
     parser.add_argument("--limit", type=int, help="Limit number of drafts (batch mode)")
     parser.add_argument("--permission", action="store_true",
                         help="Permission mode: Draft emails asking for permission (no video link)")
+    parser.add_argument("--refresh-metadata", action="store_true",
+                        help="Ignore cached channel metadata and re-fetch with yt-dlp")
     
     args = parser.parse_args()
+    _refresh_metadata = args.refresh_metadata
     
     if args.channel:
         interactive_draft_and_schedule(target_channel_id=args.channel, permission_mode=args.permission)
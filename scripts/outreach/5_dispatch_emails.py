@@ -17,13 +17,18 @@ Examples:
 """
 import smtplib
 import datetime
+import threading
 import time
 import json
+import orjson
 import os
 import re
 import requests
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
 from dateutil import parser as date_parser
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))  # Add scripts/ to path
@@ -58,24 +63,80 @@ if not SENDERS:
     print('⚠️ ERROR: No SMTP accounts found. Define SMTP_ACCOUNTS as JSON in your environment or .env (see .env.example). Aborting to avoid using hard-coded credentials.')
     sys.exit(1)
 
+# Relative start times like "1m", "+5m", "10min", "30 minutes"
+_RELATIVE_MINUTES_RE = re.compile(r"^\+?(\d+)\s*(m|min|mins|minutes?)$")
+
+# Lead fields create_schedule reads (projection for the ready_to_send query)
+DISPATCH_FIELDS = ["channel_id", "creator_name", "channel_name", "email", "draft_email.subject", "draft_email.body"]
+
+# API-mode handoffs marked sent per bulk_write (small, so a crash leaves few scheduled leads still ready_to_send)
+DB_WRITE_BATCH = 25
+
 # Schedule storage file
 SCHEDULE_FILE = Path(__file__).parent.parent.parent / "data" / "email_schedule.json"
 SCHEDULE_FILE.parent.mkdir(parents=True, exist_ok=True)
+# Per-item status updates appended during dispatch, folded into SCHEDULE_FILE periodically and at the end
+SCHEDULE_LOG = SCHEDULE_FILE.with_suffix(".log.jsonl")
+SNAPSHOT_EVERY = 10  # Results between consolidated snapshots
+
+
+def _open_smtp(sender):
+    """Connect to ZeptoMail, STARTTLS and log in as the given sender. Returns the live connection."""
+    server = smtplib.SMTP(SMTP_SERVER, PORT)
+    server.starttls()
+    server.login(sender['username'], sender['password'])
+    return server
+
+
+def close_smtp_connections(connections):
+    """Politely close every pooled SMTP connection."""
+    for server in connections.values():
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+    connections.clear()
 
 
-def send_email(sender, to_email, subject, body):
-    """Send email using ZeptoMail SMTP."""
+def build_message(subject, body):
+    """
+    MIME-encode a draft once, with SMTP (CRLF) line endings. From/To are prefixed
+    per send, so the same bytes serve any sender or test address.
+    """
     msg = EmailMessage()
     msg['Subject'] = subject
-    msg['From'] = f"Victor from EulaIQ <{sender['email']}>"
-    msg['To'] = to_email
     msg.set_content(body)
+    return msg.as_bytes(policy=SMTP_POLICY)
+
+
+def send_email(sender, to_email, subject, body, connections=None, message=None):
+    """
+    Send email using ZeptoMail SMTP.
+    connections: optional {sender email: SMTP} pool reused across calls, so a batch pays the
+    TLS handshake and login once per sender. Dropped connections are reopened once.
+    message: the draft pre-encoded by build_message (built here if not given).
+    """
+    if message is None:
+        message = build_message(subject, body)
+    data = f"From: Victor from EulaIQ <{sender['email']}>\r\nTo: {to_email}\r\n".encode() + message
 
     try:
-        with smtplib.SMTP(SMTP_SERVER, PORT) as server:
-            server.starttls()
-            server.login(sender['username'], sender['password'])
-            server.send_message(msg)
+        if connections is None:
+            with smtplib.SMTP(SMTP_SERVER, PORT) as server:
+                server.starttls()
+                server.login(sender['username'], sender['password'])
+                server.sendmail(sender['email'], [to_email], data)
+            return True
+        
+        server = connections.get(sender['email'])
+        if server is None:
+            server = connections[sender['email']] = _open_smtp(sender)
+        try:
+            server.sendmail(sender['email'], [to_email], data)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError):
+            # Idle connections get dropped while we wait between scheduled sends
+            server = connections[sender['email']] = _open_smtp(sender)
+            server.sendmail(sender['email'], [to_email], data)
         return True
     except Exception as e:
         print(f"  ❌ Send failed: {e}")
@@ -88,7 +149,7 @@ def parse_date(date_str):
     now = datetime.datetime.now()
     
     # Check for relative time like "1m", "+5m", "10min", "30 minutes"
-    match = re.match(r"^\+?(\d+)\s*(m|min|mins|minutes?)$", date_str)
+    match = _RELATIVE_MINUTES_RE.match(date_str)
     if match:
         minutes = int(match.group(1))
         result = now + datetime.timedelta(minutes=minutes)
@@ -104,7 +165,11 @@ def parse_date(date_str):
     else:
         # Try to parse specific date
         try:
-            parsed = date_parser.parse(date_str)
+            # ISO dates ("2025-12-10", "2025-12-10 14:00") skip dateutil's heuristics
+            try:
+                parsed = datetime.datetime.fromisoformat(date_str)
+            except ValueError:
+                parsed = date_parser.parse(date_str)
             # If only date given, set time to 9:00 AM
             if parsed.hour == 0 and parsed.minute == 0:
                 parsed = parsed.replace(hour=9, minute=0)
@@ -136,18 +201,20 @@ def create_schedule(leads, sender_id, start_date, interval_minutes, test_email=N
     
     valid_index = 0  # Track actual scheduled items for round-robin
     
-    for i, lead in enumerate(leads):
-        email = test_email if test_email else lead.get("email")
+    for lead in leads:
+        lead_email = lead.get("email")
+        creator_name = lead.get("creator_name") or lead.get("channel_name") or "Unknown"
+        email = test_email if test_email else lead_email
         if not email:
-            print(f"  [SKIP] {lead.get('creator_name', 'Unknown')}: No email address")
+            print(f"  [SKIP] {creator_name}: No email address")
             continue
         
-        draft = lead.get("draft_email", {})
+        draft = lead.get("draft_email") or {}
         subject = draft.get("subject")
         body = draft.get("body")
         
         if not subject or not body:
-            print(f"  [SKIP] {lead.get('creator_name', 'Unknown')}: No draft email")
+            print(f"  [SKIP] {creator_name}: No draft email")
             continue
         
         # Select sender: round-robin or fixed
@@ -156,18 +223,16 @@ def create_schedule(leads, sender_id, start_date, interval_minutes, test_email=N
         else:
             current_sender_id = sender_id
         
-        current_sender = SENDERS[current_sender_id]
-        
         schedule.append({
             "index": valid_index + 1,
             "channel_id": lead["channel_id"],
-            "creator_name": lead.get("creator_name", lead.get("channel_name", "Unknown")),
+            "creator_name": creator_name,
             "to_email": email,
-            "original_email": lead.get("email"),
+            "original_email": lead_email,
             "subject": subject,
             "body": body,
             "sender_id": current_sender_id,
-            "sender_email": current_sender["email"],
+            "sender_email": SENDERS[current_sender_id]["email"],
             "scheduled_time": current_time.isoformat(),
             "status": "pending"
         })
@@ -178,22 +243,111 @@ def create_schedule(leads, sender_id, start_date, interval_minutes, test_email=N
     return schedule
 
 
+def write_schedule_snapshot(schedule):
+    """Write the whole schedule to SCHEDULE_FILE."""
+    SCHEDULE_FILE.write_bytes(orjson.dumps({
+        "created_at": datetime.datetime.now().isoformat(),
+        "items": schedule
+    }))
+
+
 def save_schedule(schedule):
-    """Save schedule to JSON file."""
-    with open(SCHEDULE_FILE, "w", encoding="utf-8") as f:
-        json.dump({
-            "created_at": datetime.datetime.now().isoformat(),
-            "items": schedule
-        }, f, indent=2)
+    """Save schedule to JSON file (a full snapshot, so any status log is folded in and removed)."""
+    write_schedule_snapshot(schedule)
+    SCHEDULE_LOG.unlink(missing_ok=True)
     print(f"\n📅 Schedule saved to: {SCHEDULE_FILE}")
 
 
+class ScheduleLog:
+    """
+    Append-only status log for a running dispatch (one JSON object per line), safe to share
+    between sender threads. Every SNAPSHOT_EVERY results the schedule is snapshotted and the
+    log restarted, so a crash loses nothing and the log stays short.
+    """
+    
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self._file = open(SCHEDULE_LOG, "ab", buffering=0)  # unbuffered: one write per record
+        self._lock = threading.Lock()
+        self._results = 0
+        self._in_flight = set()  # Indexes with a "sending" record and no result yet
+    
+    def _write(self, record):
+        self._file.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+    
+    def sending(self, item):
+        """Record that an item is about to go out; without a later result it is retried on resume."""
+        with self._lock:
+            self._write({"index": item["index"], "status": "sending"})
+            self._in_flight.add(item["index"])
+    
+    def result(self, item):
+        """Record an item's final status."""
+        with self._lock:
+            self._write({"index": item["index"], "status": item["status"], "sent_at": item.get("sent_at")})
+            self._in_flight.discard(item["index"])
+            self._results += 1
+            if self._results % SNAPSHOT_EVERY == 0:
+                write_schedule_snapshot(self.schedule)
+                self._file.truncate(0)
+                # Other threads' sends are still out: keep their "sending" records, so a crash
+                # before they finish still flags them as possible duplicates on resume
+                for index in self._in_flight:
+                    self._write({"index": index, "status": "sending"})
+    
+    def close(self):
+        self._file.close()
+
+
 def load_schedule():
-    """Load schedule from JSON file."""
+    """Load schedule from JSON file, replaying any status log left by an interrupted dispatch."""
     if not SCHEDULE_FILE.exists():
         return None
-    with open(SCHEDULE_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    data = orjson.loads(SCHEDULE_FILE.read_bytes())
+    
+    if SCHEDULE_LOG.exists():
+        items = {item["index"]: item for item in data["items"]}
+        with open(SCHEDULE_LOG, "rb") as f:
+            for line in f:
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # Torn last line from a crash mid-write
+                item = items.get(record["index"])
+                if item:
+                    item["status"] = record["status"]
+                    if record.get("sent_at"):
+                        item["sent_at"] = record["sent_at"]
+        
+        # "sending" with no result after it: the run stopped mid-send, so it goes back in the queue
+        in_flight = [item for item in data["items"] if item["status"] == "sending"]
+        for item in in_flight:
+            item["status"] = "pending"
+        if in_flight:
+            names = ", ".join(item["creator_name"] for item in in_flight)
+            print(f"⚠️ {len(in_flight)} email(s) were mid-send when the last run stopped and will be retried: {names}")
+            print("   Check the sent folder first if you want to avoid a duplicate.")
+    return data
+
+
+def _schedule_lines(schedule):
+    """Yield the display lines for each schedule item."""
+    for item in schedule:
+        status = item["status"]
+        status_icon = "⏳" if status == "pending" else "✅" if status == "sent" else "❌"
+        
+        yield f"\n{status_icon} [{item['index']}] {item['creator_name']}\n"
+        yield f"   To: {item['to_email']}\n"
+        if item.get("original_email") and item["original_email"] != item["to_email"]:
+            yield f"   (Original: {item['original_email']} - TEST MODE)\n"
+        yield f"   Subject: {item['subject'][:50]}...\n"
+        yield f"   Via: {item['sender_email']}\n"
+        yield f"   Scheduled: {_format_iso(item['scheduled_time'])}\n"
+
+
+def _format_iso(timestamp):
+    """'2025-12-10T09:00:00.123' -> '2025-12-10 09:00:00' without parsing the datetime."""
+    return timestamp[:19].replace("T", " ")
 
 
 def display_schedule(schedule):
@@ -202,26 +356,12 @@ def display_schedule(schedule):
     print("📅 EMAIL SCHEDULE")
     print("=" * 70)
     
-    for item in schedule:
-        scheduled = datetime.datetime.fromisoformat(item["scheduled_time"])
-        status_icon = "⏳" if item["status"] == "pending" else "✅" if item["status"] == "sent" else "❌"
-        
-        print(f"\n{status_icon} [{item['index']}] {item['creator_name']}")
-        print(f"   To: {item['to_email']}")
-        if item.get("original_email") and item["original_email"] != item["to_email"]:
-            print(f"   (Original: {item['original_email']} - TEST MODE)")
-        print(f"   Subject: {item['subject'][:50]}...")
-        print(f"   Via: {item['sender_email']}")
-        print(f"   Scheduled: {scheduled.strftime('%Y-%m-%d %H:%M:%S')}")
+    sys.stdout.writelines(_schedule_lines(schedule))
     
     print("\n" + "=" * 70)
-    
-    first_time = datetime.datetime.fromisoformat(schedule[0]["scheduled_time"])
-    last_time = datetime.datetime.fromisoformat(schedule[-1]["scheduled_time"])
-    
     print(f"Total: {len(schedule)} emails")
-    print(f"First: {first_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Last:  {last_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"First: {_format_iso(schedule[0]['scheduled_time'])}")
+    print(f"Last:  {_format_iso(schedule[-1]['scheduled_time'])}")
     print("=" * 70)
 
 
@@ -276,78 +416,35 @@ def send_to_scheduler(item, sender_account):
         return False
 
 
-def execute_schedule(schedule, dry_run=False, test_mode=False, use_api=True):
+def _run_sender_queue(items, total, dry_run, test_mode, status_log, stop):
     """
-    Execute the schedule.
-    If use_api=True, sends requests to the scheduler API immediately.
-    If use_api=False, waits locally and sends via SMTP.
+    Local mode: send one sender's items in schedule order over its own SMTP connection,
+    sleeping until each item's scheduled time. Returns (sent_count, failed_count).
     """
     db = get_db()
-    
+    connections = {}  # sender email -> live SMTP connection
     sent_count = 0
     failed_count = 0
     
-    print("\n🚀 Starting scheduled dispatch...")
-    if dry_run:
-        print("   (DRY RUN - no emails will actually be sent)")
-    if test_mode:
-        print("   (TEST MODE - sending to test email, lead status will NOT be updated)")
-    if use_api:
-        print(f"   (API MODE - Offloading scheduling to {SCHEDULER_API_URL})")
-    else:
-        print("   (LOCAL MODE - Waiting locally to send)")
-    print()
+    # Deadlines on the monotonic clock: parsed once, and immune to wall-clock jumps (DST, NTP)
+    t0_wall = datetime.datetime.now()
+    t0_mono = time.monotonic()
+    scheduled_times = [datetime.datetime.fromisoformat(item["scheduled_time"]) for item in items]
+    deadlines = [t0_mono + (scheduled - t0_wall).total_seconds() for scheduled in scheduled_times]
     
-    for item in schedule:
-        if item["status"] != "pending":
-            continue
-        
-        scheduled_time = datetime.datetime.fromisoformat(item["scheduled_time"])
-        now = datetime.datetime.now()
-        
-        sender = SENDERS[item["sender_id"]]
-        
-        if use_api:
-            # API Mode: Send immediately to scheduler
-            print(f"\n📤 [{item['index']}/{len(schedule)}] Scheduling for {item['creator_name']}...")
-            print(f"   To: {item['to_email']}")
-            print(f"   Time: {scheduled_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    try:
+        for item, scheduled_time, deadline in zip(items, scheduled_times, deadlines):
+            sender = SENDERS[item["sender_id"]]
+            # Encode the draft before waiting, so the send itself is just the SMTP exchange
+            message = build_message(item["subject"], item["body"])
             
-            if dry_run:
-                print("   [DRY RUN - skipped]")
-                item["status"] = "dry_run"
-                sent_count += 1
-                continue
-                
-            if send_to_scheduler(item, sender):
-                print("   ✅ Scheduled successfully via API!")
-                item["status"] = "scheduled_external"
-                item["sent_at"] = datetime.datetime.now().isoformat() # Handoff time
-                
-                if not test_mode:
-                    # Mark as sent in DB since we handed it off
-                    db.mark_sent(
-                        channel_id=item["channel_id"],
-                        subject=item["subject"],
-                        body=item["body"],
-                        sent_via=f"{sender['email']} (via scheduler)"
-                    )
-                else:
-                    print("   [TEST MODE] Lead status NOT updated")
-                
-                sent_count += 1
-            else:
-                item["status"] = "failed"
-                failed_count += 1
-                
-        else:
-            # Local Mode: Wait and send
-            if scheduled_time > now:
-                wait_seconds = (scheduled_time - now).total_seconds()
+            wait_seconds = deadline - time.monotonic()
+            if wait_seconds > 0:
                 print(f"⏳ Waiting {int(wait_seconds)}s until {scheduled_time.strftime('%H:%M:%S')} for {item['creator_name']}...")
-                time.sleep(wait_seconds)
+                if stop.wait(wait_seconds):
+                    break  # Interrupted: leave the rest pending for --resume
             
-            print(f"\n📧 [{item['index']}/{len(schedule)}] Sending to {item['creator_name']} ({item['to_email']})...")
+            print(f"\n📧 [{item['index']}/{total}] Sending to {item['creator_name']} ({item['to_email']})...")
             print(f"   Via: {sender['email']}")
             print(f"   Subject: {item['subject'][:50]}...")
             
@@ -357,12 +454,14 @@ def execute_schedule(schedule, dry_run=False, test_mode=False, use_api=True):
                 sent_count += 1
                 continue
             
-            if send_email(sender, item["to_email"], item["subject"], item["body"]):
+            status_log.sending(item)
+            if send_email(sender, item["to_email"], item["subject"], item["body"], connections, message):
                 print("   ✅ Sent!")
                 item["status"] = "sent"
                 item["sent_at"] = datetime.datetime.now().isoformat()
                 
                 if not test_mode:
+                    # Written right away: local sends can be hours apart
                     db.mark_sent(
                         channel_id=item["channel_id"],
                         subject=item["subject"],
@@ -376,8 +475,115 @@ def execute_schedule(schedule, dry_run=False, test_mode=False, use_api=True):
             else:
                 item["status"] = "failed"
                 failed_count += 1
-        
-        save_schedule(schedule)
+            
+            status_log.result(item)
+    finally:
+        close_smtp_connections(connections)
+    
+    return sent_count, failed_count
+
+
+def execute_schedule(schedule, dry_run=False, test_mode=False, use_api=True):
+    """
+    Execute the schedule.
+    If use_api=True, sends requests to the scheduler API immediately.
+    If use_api=False, waits locally and sends via SMTP, one worker thread per sender
+    so a slow send on one account doesn't delay the others.
+    """
+    db = get_db()
+    
+    sent_count = 0
+    failed_count = 0
+    
+    print("\n🚀 Starting scheduled dispatch...")
+    if dry_run:
+        print("   (DRY RUN - no emails will actually be sent)")
+    if test_mode:
+        print("   (TEST MODE - sending to test email, lead status will NOT be updated)")
+    if use_api:
+        print(f"   (API MODE - Offloading scheduling to {SCHEDULER_API_URL})")
+    else:
+        print("   (LOCAL MODE - Waiting locally to send)")
+    print()
+    
+    pending_sent = []  # API-mode handoffs not yet marked sent in the DB
+    status_log = ScheduleLog(schedule)
+    try:
+        if use_api:
+            for item in schedule:
+                if item["status"] != "pending":
+                    continue
+                
+                scheduled_time = datetime.datetime.fromisoformat(item["scheduled_time"])
+                sender = SENDERS[item["sender_id"]]
+                
+                # API Mode: Send immediately to scheduler
+                print(f"\n📤 [{item['index']}/{len(schedule)}] Scheduling for {item['creator_name']}...")
+                print(f"   To: {item['to_email']}")
+                print(f"   Time: {scheduled_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                
+                if dry_run:
+                    print("   [DRY RUN - skipped]")
+                    item["status"] = "dry_run"
+                    sent_count += 1
+                    continue
+                
+                status_log.sending(item)
+                if send_to_scheduler(item, sender):
+                    print("   ✅ Scheduled successfully via API!")
+                    item["status"] = "scheduled_external"
+                    item["sent_at"] = datetime.datetime.now().isoformat() # Handoff time
+                    
+                    if not test_mode:
+                        # Mark as sent in DB since we handed it off (batched; handoffs are back-to-back)
+                        pending_sent.append({
+                            "channel_id": item["channel_id"],
+                            "subject": item["subject"],
+                            "body": item["body"],
+                            "sent_via": f"{sender['email']} (via scheduler)"
+                        })
+                        if len(pending_sent) >= DB_WRITE_BATCH:
+                            db.mark_sent_bulk(pending_sent)
+                            pending_sent.clear()
+                    else:
+                        print("   [TEST MODE] Lead status NOT updated")
+                    
+                    sent_count += 1
+                else:
+                    item["status"] = "failed"
+                    failed_count += 1
+                
+                status_log.result(item)
+        else:
+            # Local Mode: one queue per sender, each waiting only for its own next send
+            queues = {}
+            for item in schedule:
+                if item["status"] == "pending":
+                    queues.setdefault(item["sender_id"], []).append(item)
+            
+            stop = threading.Event()
+            run_args = (len(schedule), dry_run, test_mode, status_log, stop)
+            if len(queues) <= 1:
+                results = [_run_sender_queue(items, *run_args) for items in queues.values()]
+            else:
+                with ThreadPoolExecutor(max_workers=len(queues)) as pool:
+                    futures = [pool.submit(_run_sender_queue, items, *run_args) for items in queues.values()]
+                    try:
+                        results = [f.result() for f in futures]
+                    except BaseException:
+                        stop.set()  # Wake sleeping workers so Ctrl+C doesn't wait out the schedule
+                        raise
+            
+            sent_count += sum(sent for sent, _ in results)
+            failed_count += sum(failed for _, failed in results)
+    finally:
+        try:
+            db.mark_sent_bulk(pending_sent)
+        except Exception as e:
+            print(f"⚠️ Failed to mark {len(pending_sent)} scheduled leads as sent: {e}")
+        status_log.close()
+        if not dry_run:
+            save_schedule(schedule)
     
     print("\n" + "=" * 50)
     print("📬 DISPATCH COMPLETE")
@@ -416,7 +622,7 @@ def dispatch_scheduled(email_id, limit, date_str, interval, dry_run=False, test_
     print(f"📅 Start: {start_date.strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"⏱️  Interval: {interval} minutes between emails")
     
-    leads = db.get_leads_by_status(LeadStatus.READY_TO_SEND)
+    leads = db.get_leads_by_status(LeadStatus.READY_TO_SEND, DISPATCH_FIELDS, limit=limit)
     
     if not leads:
         print("\n❌ No leads marked as ready_to_send.")
@@ -425,10 +631,11 @@ def dispatch_scheduled(email_id, limit, date_str, interval, dry_run=False, test_
         print("  python manage_leads.py approve-all")
         return
     
-    if limit:
-        leads = leads[:limit]
-    
-    print(f"📋 Leads to send: {len(leads)}")
+    if limit and len(leads) == limit:
+        # Only worth a count when the limit may have cut the list short
+        print(f"📋 Leads to send: {len(leads)} (of {db.count_by_status(LeadStatus.READY_TO_SEND)} ready)")
+    else:
+        print(f"📋 Leads to send: {len(leads)}")
     
     if test_email:
         print(f"🧪 TEST MODE: All emails will be sent to {test_email}")
@@ -510,11 +717,8 @@ def show_schedule():
     print(f"Schedule created: {data['created_at']}")
     display_schedule(data["items"])
     
-    pending = sum(1 for i in data["items"] if i["status"] == "pending")
-    sent = sum(1 for i in data["items"] if i["status"] == "sent")
-    failed = sum(1 for i in data["items"] if i["status"] == "failed")
-    
-    print(f"\nStatus: {pending} pending, {sent} sent, {failed} failed")
+    counts = Counter(item["status"] for item in data["items"])
+    print(f"\nStatus: {counts['pending']} pending, {counts['sent']} sent, {counts['failed']} failed")
 
 
 def resume_schedule(dry_run=False, use_api=True):
@@ -8,11 +8,14 @@ Implements the 3-7-10-15 day followup pattern.
 import asyncio
 import json
 import os
-import smtplib
+import time
+import aiosmtplib
 from pathlib import Path
 from datetime import datetime, timedelta
 from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
 from itertools import cycle
+from diskcache import Cache
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))  # Add scripts/ to path
 
@@ -35,24 +38,139 @@ if env_smtp_accounts:
 else:
     SENDERS = []
 
+# Idle seconds after which a pooled SMTP session is checked with NOOP before reuse
+SMTP_IDLE_CHECK = 30
+
+# Seconds a pre-run SMTP login may take before the run starts without that session
+SMTP_WARM_TIMEOUT = 10
+
+# Concurrent SMTP sessions per sender account (keep within the provider's per-account cap)
+SMTP_CONNECTIONS_PER_SENDER = 3
+
 if not SENDERS:
     print('⚠️ ERROR: No SMTP accounts found for followups. Define SMTP_ACCOUNTS in your environment or .env (see .env.example). Aborting.')
     sys.exit(1)
 
 
-def send_email(sender, to_email, subject, body):
-    """Send email using ZeptoMail SMTP."""
+class SMTPPool:
+    """
+    Persistent aiosmtplib sessions, up to SMTP_CONNECTIONS_PER_SENDER per sender, opened on
+    first use. A followup run pays the TLS handshake and login once per session, and each
+    account never has more than its provider's concurrency cap in flight.
+    """
+    
+    def __init__(self, per_sender=SMTP_CONNECTIONS_PER_SENDER):
+        self.per_sender = per_sender
+        self._idle = {}   # sender email -> [(SMTP, time.monotonic() of last send)]
+        self._slots = {}  # sender email -> Semaphore(per_sender)
+    
+    async def _open(self, sender):
+        client = aiosmtplib.SMTP(hostname=SMTP_SERVER, port=PORT, start_tls=True)
+        await client.connect()
+        await client.login(sender['username'], sender['password'])
+        return client
+    
+    async def send(self, sender, to_email, message):
+        """Send raw message bytes on one of sender's sessions; idle sessions are NOOP-checked, dropped ones reopened once."""
+        key = sender['email']
+        slots = self._slots.setdefault(key, asyncio.Semaphore(self.per_sender))
+        async with slots:
+            idle = self._idle.setdefault(key, [])
+            client, last_used = idle.pop() if idle else (None, 0.0)
+            try:
+                if client is not None and time.monotonic() - last_used > SMTP_IDLE_CHECK:
+                    try:
+                        await client.noop()
+                    except (aiosmtplib.SMTPException, OSError):
+                        client = None
+                if client is None:
+                    client = await self._open(sender)
+                try:
+                    await client.sendmail(sender['email'], [to_email], message)
+                except aiosmtplib.SMTPServerDisconnected:
+                    client = await self._open(sender)
+                    await client.sendmail(sender['email'], [to_email], message)
+            except BaseException:
+                if client is not None:
+                    client.close()  # Don't hand a half-broken session to the next send
+                raise
+            idle.append((client, time.monotonic()))
+    
+    async def warm(self, senders):
+        """
+        Open one session per sender account up front, all concurrently, so startup costs one
+        login round-trip rather than one per sender. Logins slower than SMTP_WARM_TIMEOUT or
+        failing are skipped here and retried on that sender's first send.
+        """
+        async def open_one(sender):
+            try:
+                client = await asyncio.wait_for(self._open(sender), SMTP_WARM_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"  ⚠️ Pre-connect to {sender['email']} timed out")
+                return
+            except (aiosmtplib.SMTPException, OSError) as e:
+                print(f"  ⚠️ Could not pre-connect {sender['email']}: {e}")
+                return
+            self._idle.setdefault(sender['email'], []).append((client, time.monotonic()))
+        
+        # SMTP_ACCOUNTS may list an account more than once; one warm session each is enough
+        unique = {sender['email']: sender for sender in senders}
+        await asyncio.gather(*(open_one(sender) for sender in unique.values()))
+    
+    async def close(self):
+        for idle in self._idle.values():
+            for client, _ in idle:
+                try:
+                    await client.quit()
+                except (aiosmtplib.SMTPException, OSError):
+                    pass
+        self._idle.clear()
+
+
+# MIME headers for a 7-bit clean plain-text message (what EmailMessage.set_content emits for one)
+PLAIN_TEXT_HEADERS = (
+    b'Content-Type: text/plain; charset="utf-8"\r\n'
+    b'Content-Transfer-Encoding: 7bit\r\n'
+    b'MIME-Version: 1.0\r\n'
+)
+
+
+def build_message(sender, to_email, subject, body):
+    """
+    Serialize a plain-text email to SMTP (CRLF) bytes. ASCII followups are assembled
+    directly; anything needing encoding (non-ASCII text, over-long lines) goes through
+    EmailMessage.
+    """
+    lines = body.splitlines()
+    header = f"From: Victor from EulaIQ <{sender['email']}>\r\nTo: {to_email}\r\nSubject: {subject}\r\n"
+    if (header.isascii() and body.isascii()
+            and not any(c in subject or c in to_email for c in '\r\n')
+            and all(len(line) <= 998 for line in lines)):
+        return header.encode() + PLAIN_TEXT_HEADERS + b'\r\n' + '\r\n'.join(lines).encode() + b'\r\n'
+    
     msg = EmailMessage()
     msg['Subject'] = subject
     msg['From'] = f"Victor from EulaIQ <{sender['email']}>"
     msg['To'] = to_email
     msg.set_content(body)
+    return msg.as_bytes(policy=SMTP_POLICY)
+
 
+async def send_email(sender, to_email, subject, body, pool=None):
+    """
+    Send email using ZeptoMail SMTP.
+    pool: optional SMTPPool to reuse sessions across calls; without one a one-off connection is used.
+    """
     try:
-        with smtplib.SMTP(SMTP_SERVER, PORT) as server:
-            server.starttls()
-            server.login(sender['username'], sender['password'])
-            server.send_message(msg)
+        message = build_message(sender, to_email, subject, body)
+        if pool is None:
+            await aiosmtplib.send(
+                message, sender=sender['email'], recipients=[to_email],
+                hostname=SMTP_SERVER, port=PORT, start_tls=True,
+                username=sender['username'], password=sender['password']
+            )
+        else:
+            await pool.send(sender, to_email, message)
         return True
     except Exception as e:
         print(f"  ❌ Send failed: {e}")
@@ -60,37 +178,37 @@ def send_email(sender, to_email, subject, body):
 
 
 FOLLOWUP_TEMPLATES = {
-    1: """Just following up on my email from a few days ago about the animation I created for your "{video_title}" video.
+    1: """Just following up on my email from a few days ago about the animation I created for your "%(video_title)s" video.
 
-Did you get a chance to watch it? Here's the link again: {branded_player_url}
+Did you get a chance to watch it? Here's the link again: %(branded_player_url)s
 
 I'd love to hear your thoughts - even if it's just "not interested right now." Either way, no pressure!
 
 Best,
 Victor""",
     
-    2: """Hey {creator_name},
+    2: """Hey %(creator_name)s,
 
 I know you're busy, so I'll keep this short.
 
-I made a full animated version of your "{video_title}" video using our system. It handles complex diagrams and equations better than generic AI tools.
+I made a full animated version of your "%(video_title)s" video using our system. It handles complex diagrams and equations better than generic AI tools.
 
-Take a look when you have a moment: {branded_player_url}
+Take a look when you have a moment: %(branded_player_url)s
 
 If you'd prefer I stop reaching out, just let me know.
 
 Victor
 CEO, EulaIQ""",
     
-    3: """Quick bump on this - the animation I generated for "{video_title}" is still available here: {branded_player_url}
+    3: """Quick bump on this - the animation I generated for "%(video_title)s" is still available here: %(branded_player_url)s
 
 If animated content isn't something you're exploring right now, totally understand. Just reply "pass" and I won't follow up again.
 
 Victor""",
     
-    4: """Last note from me - if you're ever curious about adding animations to your content, the sample I created for "{video_title}" will be here: {branded_player_url}
+    4: """Last note from me - if you're ever curious about adding animations to your content, the sample I created for "%(video_title)s" will be here: %(branded_player_url)s
 
-Thanks for your time, {creator_name}.
+Thanks for your time, %(creator_name)s.
 
 Best,
 Victor
@@ -98,10 +216,73 @@ EulaIQ"""
 }
 
 
+# Lead fields read when previewing/sending followups (projection for the followup query)
+FOLLOWUP_FIELDS = [
+    "channel_id", "creator_name", "channel_name", "email", "video_title", "branded_player_url",
+    "followup_count", "reached_out_at", "sent_email.subject"
+]
+
+# Followups recorded per bulk_write
+DB_WRITE_BATCH = 50
+
+# Leads per Bedrock call when AI-writing followups (one request drafts the whole batch)
+AI_FOLLOWUP_BATCH = 10
+
+# AI-written followups, cached per (lead, followup number) so a --dry-run preview is
+# exactly what --send later sends, and retries after a failed send skip Bedrock
+FOLLOWUP_CACHE_DIR = Path(__file__).parent.parent.parent / "data" / "followup_ai_cache"
+FOLLOWUP_CACHE_TTL = 7 * 24 * 60 * 60
+_followup_cache = Cache(str(FOLLOWUP_CACHE_DIR))
+
+# Optional latency-optimized inference for AI followups (needs a supporting model/region,
+# e.g. Claude 3.5 Haiku in us-east-2). It replaces prompt caching on that call.
+FOLLOWUP_LATENCY_OPTIMIZED = os.getenv("AWS_BEDROCK_LATENCY_OPTIMIZED", "").lower() in ("1", "true", "yes")
+FOLLOWUP_MODEL_ID = os.getenv("AWS_BEDROCK_FOLLOWUP_MODEL_ID") or None
+
+# Invariant instructions for AI-written followups, sent as a cached system prompt
+# (Bedrock only caches prefixes above the model's minimum token count; below it this is a no-op)
+FOLLOWUP_SYSTEM_PROMPT = """Write brief, professional followup emails for creators who haven't responded.
+The user message is a JSON array with one entry per creator: the followup number and the
+original outreach context.
+
+Tone: Friendly but professional. Not pushy. Give them an easy out.
+Keep each email SHORT (3-4 sentences max).
+
+Return exactly one email per input entry, in the same order, through the emit_followups tool."""
+
+# Tool the model must call with the drafted followups (Bedrock returns its arguments as JSON)
+FOLLOWUP_TOOL = {
+    "name": "emit_followups",
+    "description": "Record the drafted followup emails, one per input entry, in input order.",
+    "inputSchema": {"json": {
+        "type": "object",
+        "properties": {
+            "emails": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"subject": {"type": "string"}, "body": {"type": "string"}},
+                    "required": ["subject", "body"],
+                },
+            },
+        },
+        "required": ["emails"],
+    }},
+}
+
+
+# Followup number -> (subject prefix, bound body % mapping), built once at import
+FOLLOWUP_SUBJECT_PREFIXES = {1: "Re: ", 2: "Re: ", 3: "Quick bump - ", 4: "Final note - "}
+COMPILED_FOLLOWUPS = {
+    n: (FOLLOWUP_SUBJECT_PREFIXES.get(n, "Re: "), template.__mod__)
+    for n, template in FOLLOWUP_TEMPLATES.items()
+}
+
+
 def get_leads_for_followup():
     """Get all leads where followup is due today or earlier."""
     db = get_db()
-    return db.get_leads_needing_followup()
+    return db.get_leads_needing_followup(fields=FOLLOWUP_FIELDS)
 
 
 def preview_followups():
@@ -130,61 +311,85 @@ def preview_followups():
     print(f"  python 6_check_followups.py --send")
 
 
-async def generate_followup_email(lead, followup_number):
-    """Generate a followup email using template or AI."""
-    # Use template if available
-    if followup_number in FOLLOWUP_TEMPLATES:
-        template = FOLLOWUP_TEMPLATES[followup_number]
-        body = template.format(
-            creator_name=lead["creator_name"],
-            video_title=lead["video_title"],
-            branded_player_url=lead.get("branded_player_url", "")
-        )
-        
-        subject_prefix = {1: "Re: ", 2: "Re: ", 3: "Quick bump - ", 4: "Final note - "}
-        original_subject = lead.get("sent_email", {}).get("subject", "Animation Draft")
-        subject = f"{subject_prefix.get(followup_number, 'Re: ')}{original_subject}"
-        
-        return subject, body
+def render_followup_email(lead, followup_number):
+    """Fill the fixed template for followup_number (must be in COMPILED_FOLLOWUPS)."""
+    subject_prefix, format_body = COMPILED_FOLLOWUPS[followup_number]
+    body = format_body({
+        "creator_name": lead["creator_name"],
+        "video_title": lead["video_title"],
+        "branded_player_url": lead.get("branded_player_url", "")
+    })
+    original_subject = lead.get("sent_email", {}).get("subject", "Animation Draft")
+    return f"{subject_prefix}{original_subject}", body
+
+
+async def generate_followup_emails_ai(batch):
+    """
+    Generate custom followups with Bedrock (for followup numbers without a template).
+    batch: [(lead, followup_number), ...], drafted in a single request.
+    Returns {channel_id: (subject, body)}.
+    """
+    emails = {}
+    todo = []
+    for lead, followup_number in batch:
+        cached = _followup_cache.get((lead["channel_id"], followup_number))
+        if cached:
+            emails[lead["channel_id"]] = cached
+        else:
+            todo.append((lead, followup_number))
+    if not todo:
+        return emails
     
-    # Fallback to AI generation for custom followups
     client = AWSBedrockClient()
     
-    prompt = f"""
-Write a brief, professional followup email #{followup_number} for a creator who hasn't responded.
-
-Original context:
-- Creator: {lead['creator_name']}
-- Video: {lead['video_title']}
-- Animation Link: {lead.get('branded_player_url', '')}
-- Days since last contact: {(datetime.utcnow() - lead.get('reached_out_at', datetime.utcnow())).days}
-
-Tone: Friendly but professional. Not pushy. Give them an easy out.
-Keep it SHORT (3-4 sentences max).
-
-Output JSON:
-{{"subject": "...", "body": "..."}}
-"""
+    now = datetime.utcnow()
+    prompt = json.dumps([
+        {
+            "followup_number": followup_number,
+            "creator": lead["creator_name"],
+            "video": lead["video_title"],
+            "animation_link": lead.get("branded_player_url", ""),
+            "days_since_last_contact": (now - lead.get("reached_out_at", now)).days,
+        }
+        for lead, followup_number in todo
+    ], indent=1)
     
-    response = await client.converse(prompt)
-    text = response["text"]
+    response = await client.converse(
+        prompt, system=FOLLOWUP_SYSTEM_PROMPT, model_id=FOLLOWUP_MODEL_ID,
+        cache_system=not FOLLOWUP_LATENCY_OPTIMIZED, latency_optimized=FOLLOWUP_LATENCY_OPTIMIZED,
+        tool=FOLLOWUP_TOOL
+    )
+    usage = response.get("usage", {})
+    if usage.get("cacheReadInputTokens") or usage.get("cacheWriteInputTokens"):
+        print(f"      (prompt cache: {usage.get('cacheReadInputTokens', 0)} read, "
+              f"{usage.get('cacheWriteInputTokens', 0)} written)")
+    if "tool_input" not in response:
+        raise ValueError(f"Bedrock did not call {FOLLOWUP_TOOL['name']}: {response['text'][:200]}")
     
-    if "```json" in text:
-        text = text.split("```json")[1].split("```")[0]
-    elif "```" in text:
-        text = text.split("```")[1].split("```")[0]
+    drafted = response["tool_input"].get("emails", [])
+    if len(drafted) != len(todo):
+        raise ValueError(f"Bedrock returned {len(drafted)} followups for {len(todo)} leads")
     
-    import json
-    data = json.loads(text.strip())
-    return data["subject"], data["body"]
+    for (lead, followup_number), data in zip(todo, drafted):
+        email = (data["subject"], data["body"])
+        _followup_cache.set((lead["channel_id"], followup_number), email, expire=FOLLOWUP_CACHE_TTL)
+        emails[lead["channel_id"]] = email
+    return emails
 
 
 async def send_followups(dry_run=False, limit=None):
-    """Send followup emails to leads that need them."""
+    """Send followup emails to leads that need them, several at a time."""
     db = get_db()
-    leads = get_leads_for_followup()
+    pool = SMTPPool()
+    
+    # The lead query runs in a worker thread while the SMTP sessions log in
+    if dry_run:
+        leads = await asyncio.to_thread(get_leads_for_followup)
+    else:
+        leads, _ = await asyncio.gather(asyncio.to_thread(get_leads_for_followup), pool.warm(SENDERS))
     
     if not leads:
+        await pool.close()
         print("🎉 No followups due today!")
         return
     
@@ -195,50 +400,85 @@ async def send_followups(dry_run=False, limit=None):
     
     # Use module-level send_email and SENDERS
     sender_iter = cycle(SENDERS)
+    pending_records = []  # Sent followups not yet recorded in MongoDB
+    db_writes = []  # Bulk writes running in worker threads
     
-    sent = 0
-    failed = 0
+    def flush_records():
+        if pending_records:
+            batch = pending_records.copy()
+            pending_records.clear()
+            db_writes.append(asyncio.create_task(asyncio.to_thread(db.record_followups_sent_bulk, batch)))
+    # Overall cap: every sender's sessions busy at once
+    in_flight = asyncio.Semaphore(len(SENDERS) * SMTP_CONNECTIONS_PER_SENDER)
     
-    for lead in leads:
+    # Leads past the fixed templates are AI-drafted in batches, started up front so
+    # template followups go out while Bedrock works
+    ai_leads = [
+        (lead, lead.get("followup_count", 0) + 1) for lead in leads
+        if lead.get("email") and lead.get("followup_count", 0) + 1 not in COMPILED_FOLLOWUPS
+    ]
+    ai_batches = {}  # channel_id -> task drafting that lead's batch
+    for i in range(0, len(ai_leads), AI_FOLLOWUP_BATCH):
+        batch = ai_leads[i:i + AI_FOLLOWUP_BATCH]
+        task = asyncio.create_task(generate_followup_emails_ai(batch))
+        for lead, _ in batch:
+            ai_batches[lead["channel_id"]] = task
+    
+    async def process_lead(lead, sender):
+        """Draft and send one followup. Returns True (sent), False (failed) or None (skipped)."""
         email = lead.get("email")
         if not email:
             print(f"  [SKIP] {lead['creator_name']}: No email")
-            continue
+            return None
         
         followup_num = lead.get("followup_count", 0) + 1
+        label = f"  [{followup_num}/4] {lead['creator_name']}..."
         
-        print(f"  [{followup_num}/4] {lead['creator_name']}...", end="")
-        
-        try:
-            subject, body = await generate_followup_email(lead, followup_num)
-            
-            if dry_run:
-                print(f" [DRY RUN]")
-                print(f"      Subject: {subject}")
-                sent += 1
-                continue
-            
-            sender = next(sender_iter)
-            
-            # Use module-level send_email function
-            if send_email(sender, email, subject, body):
-                print(" ✅ Sent")
+        async with in_flight:
+            try:
+                if followup_num in COMPILED_FOLLOWUPS:
+                    subject, body = render_followup_email(lead, followup_num)
+                else:
+                    subject, body = (await ai_batches[lead["channel_id"]])[lead["channel_id"]]
                 
-                # Update MongoDB
-                db.record_followup_sent(
-                    channel_id=lead["channel_id"],
-                    followup_number=followup_num,
-                    subject=subject,
-                    body=body
-                )
-                sent += 1
-            else:
-                print(" ❌ Failed")
-                failed += 1
+                if dry_run:
+                    print(f"{label} [DRY RUN]")
+                    print(f"      Subject: {subject}")
+                    return True
                 
-        except Exception as e:
-            print(f" ❌ Error: {e}")
-            failed += 1
+                if await send_email(sender, email, subject, body, pool):
+                    print(f"{label} ✅ Sent")
+                    
+                    # Update MongoDB (batched)
+                    pending_records.append({
+                        "channel_id": lead["channel_id"],
+                        "followup_number": followup_num,
+                        "subject": subject,
+                        "body": body
+                    })
+                    if len(pending_records) >= DB_WRITE_BATCH:
+                        flush_records()
+                    return True
+                
+                print(f"{label} ❌ Failed")
+                return False
+            
+            except Exception as e:
+                print(f"{label} ❌ Error: {e}")
+                return False
+    
+    try:
+        # Senders are assigned round-robin up front, in lead order
+        results = await asyncio.gather(*(process_lead(lead, next(sender_iter)) for lead in leads))
+    finally:
+        for task in ai_batches.values():
+            task.cancel()
+        flush_records()
+        await asyncio.gather(*db_writes)
+        await pool.close()
+    
+    sent = sum(1 for r in results if r is True)
+    failed = sum(1 for r in results if r is False)
     
     print(f"\n{'='*40}")
     print(f"Followups Complete: {sent} sent, {failed} failed")
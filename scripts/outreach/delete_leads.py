@@ -13,6 +13,19 @@ from pymongo import MongoClient
 # Load environment variables
 load_dotenv()
 
+# Statuses removed by this script
+DELETE_STATUSES = ["harvested", "qualified"]
+
+
+def count_by_status(leads, statuses):
+    """Count leads per status for the given statuses in one aggregation (uses the status indexes)."""
+    pipeline = [
+        {"$match": {"status": {"$in": statuses}}},
+        {"$group": {"_id": "$status", "n": {"$sum": 1}}},
+    ]
+    counts = {row["_id"]: row["n"] for row in leads.aggregate(pipeline)}
+    return {status: counts.get(status, 0) for status in statuses}
+
 def main():
     """Delete all harvested and qualified leads."""
     mongodb_uri = os.environ.get("MONGODB_URI")
@@ -24,9 +37,13 @@ def main():
     client = MongoClient(mongodb_uri)
     db = client.eulaiq_outreach
     
+    # Same (status, scheduled_send_time) index OutreachDB creates; a no-op if it already exists
+    status_index = db.leads.create_index([("status", 1), ("scheduled_send_time", 1)])
+    
     # Count before deletion
-    harvested_count = db.leads.count_documents({"status": "harvested"})
-    qualified_count = db.leads.count_documents({"status": "qualified"})
+    before = count_by_status(db.leads, DELETE_STATUSES)
+    harvested_count = before["harvested"]
+    qualified_count = before["qualified"]
     
     print("=" * 50)
     print("LEAD DELETION SUMMARY")
@@ -49,13 +66,14 @@ def main():
         return
     
     # Delete harvested and qualified leads
-    result = db.leads.delete_many({"status": {"$in": ["harvested", "qualified"]}})
+    result = db.leads.delete_many({"status": {"$in": DELETE_STATUSES}}, hint=status_index)
     print(f"\n✓ Deleted {result.deleted_count} leads")
     
     # Show remaining
-    remaining = db.leads.count_documents({})
-    approved_count = db.leads.count_documents({"status": "approved"})
-    disqualified_count = db.leads.count_documents({"status": "disqualified"})
+    remaining = db.leads.estimated_document_count()
+    after = count_by_status(db.leads, ["approved", "disqualified"])
+    approved_count = after["approved"]
+    disqualified_count = after["disqualified"]
     
     print(f"\nRemaining leads: {remaining}")
     print(f"  Approved: {approved_count}")
@@ -6,9 +6,12 @@ Downloads/Trims audio for all APPROVED leads into a dated folder.
 """
 import os
 import sys
+import json
+import time
 import shutil
+import sqlite3
 import subprocess
-import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime
 import yt_dlp
@@ -26,59 +29,180 @@ EXPORT_BASE_DIR.mkdir(parents=True, exist_ok=True)
 
 TRIM_DURATION = 300  # 5 minutes
 
+# Resolved YouTube audio stream URLs, reused until shortly before the CDN link expires
+URL_CACHE_FILE = AUDIO_DIR / ".url_cache.sqlite"
+URL_CACHE_TTL = 4 * 60 * 60  # 4 hours
+
+# Parallel YouTube audio streams (separate processes) and ffmpeg trims of local files
+DOWNLOAD_WORKERS = min(6, os.cpu_count() or 1)
+TRIM_WORKERS = 4
+
+# Characters Windows rejects in filenames, plus ASCII control characters
+_UNSAFE_FILENAME_CHARS = str.maketrans('', '', '<>:"/\\|?*' + ''.join(map(chr, range(32))))
+
 def sanitize_filename(name):
-    return re.sub(r'[<>:"/\\|?*]', '', name).strip()
+    return name.translate(_UNSAFE_FILENAME_CHARS).strip()
 
-def download_audio(video_url, video_id):
-    """Download audio from YouTube video using yt-dlp."""
-    # We download the best audio (likely m4a or webm) and let trim_audio handle the MP3 conversion
-    # This avoids double conversion and potential ffmpeg issues within yt-dlp
-    
-    # Check if any file with this video_id exists
-    for existing in AUDIO_DIR.glob(f"{video_id}.*"):
-        return existing
+def _url_cache():
+    """Open the stream URL cache (one short-lived connection per call; safe across worker processes)."""
+    conn = sqlite3.connect(URL_CACHE_FILE, timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS streams "
+        "(video_id TEXT PRIMARY KEY, url TEXT, headers TEXT, expires REAL)"
+    )
+    return conn
 
-    print(f"    Downloading audio from {video_url}...")
+def resolve_audio_stream(video_url, video_id, refresh=False):
+    """
+    Return (stream_url, http_headers) for a video's best audio stream, or (None, None).
+    Resolved URLs are cached per video_id for URL_CACHE_TTL so retries skip yt-dlp extraction.
+    """
+    try:
+        with _url_cache() as conn:
+            if refresh:
+                conn.execute("DELETE FROM streams WHERE video_id = ?", (video_id,))
+            else:
+                row = conn.execute(
+                    "SELECT url, headers FROM streams WHERE video_id = ? AND expires > ?",
+                    (video_id, time.time())
+                ).fetchone()
+                if row:
+                    return row[0], json.loads(row[1])
+    except sqlite3.Error as e:
+        print(f"    URL cache unavailable: {e}")
+    
     ydl_opts = {
         'format': 'bestaudio/best',
-        'outtmpl': str(AUDIO_DIR / f"{video_id}.%(ext)s"),
         'quiet': True,
         'no_warnings': True,
-        'ignoreerrors': True
+        'skip_download': True,
     }
-    
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl: # type: ignore
-            info = ydl.extract_info(video_url, download=True)
-            if not info:
-                return None
-            # Find the downloaded file
-            ext = info.get('ext', 'm4a')
-            downloaded_path = AUDIO_DIR / f"{video_id}.{ext}"
-            if downloaded_path.exists():
-                return downloaded_path
-            # Fallback search
-            for f in AUDIO_DIR.glob(f"{video_id}.*"):
-                return f
-            return None
+            info = ydl.extract_info(video_url, download=False)
     except Exception as e:
-        print(f"    Download failed: {e}")
-        return None
+        print(f"    Could not resolve audio stream: {e}")
+        return None, None
+    if not info or not info.get('url'):
+        print("    Could not resolve audio stream")
+        return None, None
+    
+    headers = info.get('http_headers') or {}
+    try:
+        with _url_cache() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO streams VALUES (?, ?, ?, ?)",
+                (video_id, info['url'], json.dumps(headers), time.time() + URL_CACHE_TTL)
+            )
+    except sqlite3.Error as e:
+        print(f"    Could not cache stream URL: {e}")
+    return info['url'], headers
+
+def stream_audio_clip(video_url, video_id, output_path, duration=TRIM_DURATION):
+    """
+    Write the first `duration` seconds of a YouTube video's audio as MP3 in one ffmpeg pass.
+    yt-dlp only resolves the direct audio stream URL; ffmpeg reads just the part it needs,
+    so the full track is never downloaded, written to disk or decoded.
+    Self-contained (all inputs are arguments) so it can run in a worker process.
+    """
+    output_path = Path(output_path)
+    if output_path.exists():
+        return output_path
+    
+    print(f"    Streaming audio from {video_url}...")
+    # A cached URL may have been revoked early; on failure resolve it fresh once
+    for refresh in (False, True):
+        stream_url, http_headers = resolve_audio_stream(video_url, video_id, refresh=refresh)
+        if not stream_url:
+            return None
+        
+        # YouTube stream URLs expect the same headers yt-dlp used
+        headers = "".join(f"{k}: {v}\r\n" for k, v in http_headers.items())
+        cmd = ['ffmpeg', '-y']
+        if headers:
+            cmd += ['-headers', headers]
+        cmd += [
+            '-t', str(duration),
+            '-i', stream_url,
+            '-vn',
+            '-acodec', 'libmp3lame',
+            '-q:a', '2',
+            '-loglevel', 'error',
+            str(output_path)
+        ]
+        
+        try:
+            subprocess.run(cmd, check=True)
+            return output_path
+        except subprocess.CalledProcessError as e:
+            print(f"    Stream/encode failed: {e}")
+            output_path.unlink(missing_ok=True)
+    return None
+
+def probe_audio(input_path):
+    """
+    Return (codec_name, duration_seconds) of the first audio stream via ffprobe.
+    Either value is None if it can't be read.
+    """
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'a:0',
+        '-show_entries', 'stream=codec_name:format=duration',
+        '-of', 'default=noprint_wrappers=1',
+        str(input_path)
+    ]
+    try:
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    fields = dict(line.split('=', 1) for line in out.splitlines() if '=' in line)
+    try:
+        length = float(fields.get('duration', ''))
+    except ValueError:
+        length = None
+    return fields.get('codec_name') or None, length
 
 def trim_audio(input_path, output_path, duration=TRIM_DURATION):
     """
     Trim audio to first N seconds using ffmpeg.
+    MP3 sources are never re-encoded: short ones are copied as-is, longer ones are cut
+    with a stream copy.
     """
     if output_path.exists():
         return output_path
     
-    # Force re-encoding to MP3 to handle WAV inputs and ensure compatibility
+    codec, length = probe_audio(input_path)
+    if codec == 'mp3':
+        if length is not None and length <= duration:
+            shutil.copyfile(input_path, output_path)
+            return output_path
+        cmd = [
+            'ffmpeg', '-y',
+            '-t', str(duration),
+            '-i', str(input_path),
+            '-map', '0:a:0',
+            '-c:a', 'copy',
+            '-loglevel', 'error',
+            str(output_path)
+        ]
+        try:
+            subprocess.run(cmd, check=True)
+            return output_path
+        except subprocess.CalledProcessError as e:
+            # Fall back to a full re-encode below
+            print(f"    Stream copy failed, re-encoding: {e}")
+            output_path.unlink(missing_ok=True)
+    
+    # Force re-encoding to MP3 to handle WAV inputs and ensure compatibility.
+    # -t as an input option stops reading the source at the cut; -vn skips cover art.
     cmd = [
         'ffmpeg', '-y',
-        '-i', str(input_path),
         '-t', str(duration),
+        '-i', str(input_path),
+        '-vn',
         '-acodec', 'libmp3lame',
         '-q:a', '2',
+        '-threads', '0',
         '-loglevel', 'error',
         str(output_path)
     ]
@@ -90,11 +214,14 @@ def trim_audio(input_path, output_path, duration=TRIM_DURATION):
         print(f"    Trim failed: {e}")
         return None
 
+# Lead fields export needs (avoids pulling transcripts and drafts)
+EXPORT_FIELDS = ["channel_name", "local_audio_path", "video_id", "video_url", "source_video.video_id"]
+
 def main():
     db = get_db()
-    leads = list(db.get_leads_by_status(LeadStatus.APPROVED))
+    total = db.count_by_status(LeadStatus.APPROVED)
     
-    if not leads:
+    if not total:
         print("No APPROVED leads found.")
         return
 
@@ -102,48 +229,71 @@ def main():
     export_dir = EXPORT_BASE_DIR / today
     export_dir.mkdir(parents=True, exist_ok=True)
     
-    print(f"Found {len(leads)} approved leads.")
+    print(f"Found {total} approved leads.")
     print(f"Exporting audios to: {export_dir}")
+    print(f"Streaming up to {DOWNLOAD_WORKERS} audio clips at a time...")
     
-    for i, lead in enumerate(leads, 1):
-        channel_name = lead.get("channel_name", "Unknown")
-        safe_name = sanitize_filename(channel_name)
-        print(f"[{i}/{len(leads)}] Processing {channel_name}...")
-        
-        # Determine source audio
-        local_audio = lead.get("local_audio_path")
-        
-        # Handle nested source_video structure
-        source_video = lead.get("source_video", {})
-        video_id = lead.get("video_id") or source_video.get("video_id")
-        video_url = lead.get("video_url")
+    # YouTube sources are streamed straight into MP3 clips in worker processes; local or
+    # already-cached sources go to the trim pool (threads are enough there - the encoding
+    # happens in ffmpeg subprocesses). Jobs are submitted while the cursor is read, so the
+    # first clips start before the remaining leads have arrived.
+    with ProcessPoolExecutor(max_workers=DOWNLOAD_WORKERS) as download_pool, \
+         ThreadPoolExecutor(max_workers=TRIM_WORKERS) as trim_pool:
+        jobs = {}           # future -> [(channel_name, dest_path), ...]
+        video_targets = {}  # video_id -> target list of the job already exporting it
+        claimed = set()     # dest paths already assigned (channel names can collide)
         
-        if not video_url and video_id:
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
-        
-        source_path = None
-        
-        if local_audio and os.path.exists(local_audio):
-            print(f"    Using local audio: {local_audio}")
-            source_path = Path(local_audio)
-        elif video_url and video_id:
-            source_path = download_audio(video_url, video_id)
-        else:
-            print("    ⚠️ No audio source available (no local file or video URL)")
-            continue
+        for i, lead in enumerate(db.iter_leads_by_status(LeadStatus.APPROVED, EXPORT_FIELDS), 1):
+            channel_name = lead.get("channel_name", "Unknown")
+            safe_name = sanitize_filename(channel_name)
+            print(f"[{i}/{total}] Processing {channel_name}...")
+            
+            dest_path = export_dir / f"{safe_name}.mp3"
+            if dest_path in claimed:
+                print(f"    ⚠️ {dest_path.name} is already being exported for another lead, skipping")
+                continue
+            
+            # Determine source audio
+            local_audio = lead.get("local_audio_path")
+            
+            # Handle nested source_video structure
+            source_video = lead.get("source_video", {})
+            video_id = lead.get("video_id") or source_video.get("video_id")
+            video_url = lead.get("video_url")
             
-        if not source_path or not source_path.exists():
-            print("    ⚠️ Source audio not found")
-            continue
+            if not video_url and video_id:
+                video_url = f"https://www.youtube.com/watch?v={video_id}"
             
-        # Trim and export
-        dest_filename = f"{safe_name}.mp3"
-        dest_path = export_dir / dest_filename
+            if local_audio and os.path.exists(local_audio):
+                print(f"    Using local audio: {local_audio}")
+                jobs[trim_pool.submit(trim_audio, Path(local_audio), dest_path)] = [(channel_name, dest_path)]
+            elif video_url and video_id:
+                if video_id in video_targets:
+                    # Results are only read after the loop, so the running job picks this up
+                    video_targets[video_id].append((channel_name, dest_path))
+                else:
+                    cached = next(AUDIO_DIR.glob(f"{video_id}.*"), None)
+                    if cached:
+                        future = trim_pool.submit(trim_audio, cached, dest_path)
+                    else:
+                        future = download_pool.submit(stream_audio_clip, video_url, video_id, str(dest_path))
+                    jobs[future] = video_targets[video_id] = [(channel_name, dest_path)]
+            else:
+                print("    ⚠️ No audio source available (no local file or video URL)")
+                continue
+            claimed.add(dest_path)
         
-        if trim_audio(source_path, dest_path):
-            print(f"    ✅ Exported: {dest_filename}")
-        else:
-            print("    ❌ Failed to export")
+        for future in as_completed(jobs):
+            targets = jobs[future]
+            result = future.result()
+            for n, (channel_name, dest_path) in enumerate(targets):
+                # Leads sharing a video get a copy of the first clip
+                if result and n:
+                    shutil.copyfile(result, dest_path)
+                if result:
+                    print(f"    ✅ Exported: {dest_path.name}")
+                else:
+                    print(f"    ❌ Failed to export {channel_name}")
 
 if __name__ == "__main__":
     main()
@@ -27,7 +27,9 @@ TOKENS_FILE = CREDENTIALS_DIR / "youtube_tokens.json"
 def get_channel_info(credentials):
     """Get the channel ID and name for the authenticated user."""
     try:
-        youtube = build('youtube', 'v3', credentials=credentials)
+        # Use the discovery document bundled with google-api-python-client
+        # instead of fetching it from Google on every authorization
+        youtube = build('youtube', 'v3', credentials=credentials, static_discovery=True)
         response = youtube.channels().list(
             part='snippet',
             mine=True
@@ -96,19 +98,27 @@ def authorize_channel():
         return None
 
 
+def token_key(token_data):
+    """Key a token by channel ID; unidentified channels fall back to their refresh token."""
+    channel_id = token_data.get('channel_id', 'UNKNOWN')
+    if channel_id == 'UNKNOWN':
+        return f"UNKNOWN:{token_data.get('refresh_token')}"
+    return channel_id
+
+
 def load_existing_tokens():
-    """Load existing tokens from file."""
+    """Load existing tokens from file, keyed by token_key() in file order."""
     if TOKENS_FILE.exists():
         with open(TOKENS_FILE, 'r') as f:
-            return json.load(f)
-    return []
+            return {token_key(t): t for t in json.load(f)}
+    return {}
 
 
 def save_tokens(tokens):
-    """Save tokens to file."""
+    """Save tokens to file (as a list, the format YOUTUBE_CHANNELS expects)."""
     CREDENTIALS_DIR.mkdir(parents=True, exist_ok=True)
     with open(TOKENS_FILE, 'w') as f:
-        json.dump(tokens, f, indent=2)
+        json.dump(list(tokens.values()), f, indent=2)
 
 
 def main():
@@ -123,7 +133,7 @@ def main():
     
     if tokens:
         print("\nExisting channels:")
-        for i, t in enumerate(tokens, 1):
+        for i, t in enumerate(tokens.values(), 1):
             print(f"  {i}. {t.get('name', 'Unknown')} ({t.get('channel_id', 'Unknown')[:12]}...)")
     
     print("\nOptions:")
@@ -143,11 +153,11 @@ def main():
             
             if token_data:
                 # Check if channel already exists (only if we have a valid ID)
-                if token_data['channel_id'] != 'UNKNOWN':
-                    existing = [t for t in tokens if t['channel_id'] == token_data['channel_id']]
-                    if existing:
-                        print(f"\n⚠️ Channel {token_data['name']} already exists. Updating...")
-                        tokens = [t for t in tokens if t['channel_id'] != token_data['channel_id']]
+                key = token_key(token_data)
+                if token_data['channel_id'] != 'UNKNOWN' and key in tokens:
+                    print(f"\n⚠️ Channel {token_data['name']} already exists. Updating...")
+                    # Drop the old entry so the updated one moves to the end, as before
+                    del tokens[key]
                 
                 # If ID is UNKNOWN, we just append it (user can fix later or retry)
                 # But better to warn them
@@ -155,7 +165,7 @@ def main():
                     print("\n⚠️ Warning: Could not identify channel ID. Token saved as UNKNOWN.")
                     print("   You might need to manually edit the .env file later.")
                 
-                tokens.append(token_data)
+                tokens[key] = token_data
                 save_tokens(tokens)
                 
                 print(f"\n✅ Added channel: {token_data['name']}")
@@ -167,14 +177,15 @@ def main():
                 print("No channels to remove.")
                 continue
             
+            keys = list(tokens)
             print("\nSelect channel to remove:")
-            for i, t in enumerate(tokens, 1):
-                print(f"  {i}. {t.get('name', 'Unknown')}")
+            for i, key in enumerate(keys, 1):
+                print(f"  {i}. {tokens[key].get('name', 'Unknown')}")
             
             try:
                 idx = int(input("Number: ")) - 1
-                if 0 <= idx < len(tokens):
-                    removed = tokens.pop(idx)
+                if 0 <= idx < len(keys):
+                    removed = tokens.pop(keys[idx])
                     save_tokens(tokens)
                     print(f"✅ Removed: {removed.get('name')}")
             except (ValueError, IndexError):
@@ -186,7 +197,7 @@ def main():
                 continue
             
             # Format for .env
-            env_value = json.dumps(tokens)
+            env_value = json.dumps(list(tokens.values()))
             
             print("\n" + "="*60)
             print("Add this to your .env file:")
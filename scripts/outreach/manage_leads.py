@@ -7,13 +7,50 @@ This is your "brain interface" to interact with all creator data.
 """
 import json
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from datetime import datetime, timedelta
-from tabulate import tabulate
+import ijson
 
 sys.path.insert(0, str(Path(__file__).parent.parent))  # Add scripts/ to path
 from db_client import get_db, LeadStatus
 
+# Imported entries looked up and written per batch (one $in query + one bulk_write each)
+IMPORT_WRITE_BATCH = 1000
+
+# Default import batches looked up concurrently (pymongo's connection pool is thread-safe)
+IMPORT_WORKERS = 4
+
+# Lead fields shown by `list`
+LIST_FIELDS = ["channel_id", "creator_name", "email", "icp_score", "status", "next_followup_date"]
+
+# `list` table layout: cells are pre-truncated, so fixed widths replace tabulate's measuring pass
+LIST_HEADERS = ["Channel ID", "Creator", "Email", "Score", "Status", "Next Followup"]
+LIST_WIDTHS = [15, 20, 25, 5, 20, 13]
+LIST_ROW = "{:<15}  {:<20}  {:<25}  {:>5}  {:<20}  {:<13}"
+LIST_RULE = "  ".join("-" * width for width in LIST_WIDTHS)
+
+# Lead fields shown by `drafts`
+DRAFT_FIELDS = ["channel_id", "creator_name", "channel_name", "email", "draft_email.subject", "draft_email.body"]
+
+# Lead fields approve-all lists
+APPROVAL_FIELDS = ["channel_id", "creator_name", "email"]
+
+# Lead fields the importers read to report and diff changes
+IMPORT_FIELDS = ["creator_name", "channel_name", "email", "branded_player_url", "source_video.title"]
+
+# Lead fields single-lead commands get back from their update (approve also prints the subject)
+APPROVE_FIELDS = ["creator_name", "email", "draft_email.subject"]
+NAME_FIELDS = ["creator_name"]
+
+
+@lru_cache(maxsize=1024)
+def _format_datetime(dt):
+    # Leads created in one batch share timestamps, so repeated rows hit the cache
+    return dt.strftime("%Y-%m-%d")
+
 
 def format_date(dt):
     """Format datetime for display."""
@@ -21,7 +58,7 @@ def format_date(dt):
         return "-"
     if isinstance(dt, str):
         return dt[:10]
-    return dt.strftime("%Y-%m-%d")
+    return _format_datetime(dt)
 
 
 def cmd_list(args):
@@ -29,35 +66,33 @@ def cmd_list(args):
     db = get_db()
     
     if args.status:
-        leads = db.get_leads_by_status(args.status)
+        leads = db.get_leads_by_status(args.status, LIST_FIELDS)
     else:
-        leads = db.get_all_leads(limit=args.limit)
+        leads = db.get_all_leads(limit=args.limit, fields=LIST_FIELDS)
     
     if not leads:
         print("No leads found.")
         return
     
-    # Prepare table data
-    table_data = []
+    lines = [LIST_ROW.format(*LIST_HEADERS), LIST_RULE]
     for lead in leads:
-        table_data.append([
+        lines.append(LIST_ROW.format(
             lead["channel_id"][:12] + "...",
-            lead["creator_name"][:20],
-            lead.get("email", "-")[:25] if lead.get("email") else "-",
-            lead.get("icp_score", "-"),
-            lead["status"],
+            # str() on nullable cells: tabulate printed None, format() with a width would raise
+            str(lead.get("creator_name"))[:20],
+            str(lead["email"])[:25] if lead.get("email") else "-",
+            str(lead.get("icp_score", "-")),
+            str(lead.get("status")),
             format_date(lead.get("next_followup_date"))
-        ])
-    
-    headers = ["Channel ID", "Creator", "Email", "Score", "Status", "Next Followup"]
-    print(tabulate(table_data, headers=headers, tablefmt="simple"))
+        ))
+    print("\n".join(lines))
     print(f"\nTotal: {len(leads)} leads")
 
 
 def cmd_show(args):
     """Show detailed info for a single lead."""
     db = get_db()
-    lead = db.get_lead_by_channel(args.channel_id)
+    lead = db.get_lead_with_recent_messages(args.channel_id, messages=3)
     
     if not lead:
         # Try searching
@@ -110,14 +145,17 @@ def cmd_show(args):
         print(f"   Via: {lead['sent_email'].get('sent_via')}")
     
     if lead.get("conversation_history"):
-        print(f"\n💬 Conversation ({len(lead['conversation_history'])} messages):")
-        for msg in lead["conversation_history"][-3:]:  # Last 3
+        print(f"\n💬 Conversation ({lead['conversation_count']} messages):")
+        for msg in lead["conversation_history"]:  # Last 3 (sliced by MongoDB)
             direction = "→" if msg["direction"] == "outbound" else "←"
             print(f"   {direction} [{format_date(msg['date'])}] {msg['content'][:50]}...")
     
-    if lead.get("notes"):
+    if lead.get("notes") or lead.get("notes_log"):
         print(f"\n📝 Notes:")
-        print(f"   {lead['notes']}")
+        if lead.get("notes"):  # Legacy text from before notes_log (add_note never rewrites it)
+            print(f"   {lead['notes']}")
+        for note in lead.get("notes_log", []):  # Last 5 (sliced by MongoDB)
+            print(f"   [{format_date(note['ts'])}] {note['text']}")
     
     print()
 
@@ -164,6 +202,40 @@ def cmd_import_emails(args):
         print(f"❌ File not found: {file_path}")
         return
     
+    if args.legacy:
+        _import_emails_legacy(db, file_path)
+        return
+    
+    # Stream the file: entries are parsed, looked up and written IMPORT_WRITE_BATCH at a time,
+    # so memory stays flat however large the export is
+    with open(file_path, "rb") as f:
+        first = _first_json_byte(f)
+        try:
+            if first == b"{":
+                # Simple format: {"channel_id": "email", ...}
+                print("📧 Detected simple format (email only)...\n")
+                _import_simple_format(db, ijson.kvitems(f, ""), args.workers)
+            elif first == b"[":
+                # Full format: [{"channel_id": "...", "email": "...", "video_url": "...", ...}]
+                print("📧 Detected full format (email + video_url + video_title)...\n")
+                _import_full_format(db, ijson.items(f, "item"), args.workers)
+            else:
+                print("❌ JSON must be an array or object")
+        except ijson.JSONError as e:
+            # Batches before the error have already been written
+            print(f"\n❌ Invalid JSON: {e}")
+            print("   Entries before the error were imported; fix the file and re-run (re-importing is safe).")
+
+
+def _first_json_byte(f):
+    """Return the first non-whitespace byte of a binary file (skipping a UTF-8 BOM) and rewind it."""
+    head = f.read(1024).lstrip(b"\xef\xbb\xbf \t\r\n")
+    f.seek(0)
+    return head[:1]
+
+
+def _import_emails_legacy(db, file_path):
+    """Load the whole file with json.load, validating it before anything is written."""
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             data = json.load(f)
@@ -173,37 +245,67 @@ def cmd_import_emails(args):
     
     # Detect format and process
     if isinstance(data, dict):
-        # Simple format: {"channel_id": "email", ...}
         print("📧 Detected simple format (email only)...\n")
-        _import_simple_format(db, data)
+        _import_simple_format(db, data.items(), IMPORT_WORKERS)
     elif isinstance(data, list):
-        # Full format: [{"channel_id": "...", "email": "...", "video_url": "...", ...}]
         print("📧 Detected full format (email + video_url + video_title)...\n")
-        _import_full_format(db, data)
+        _import_full_format(db, data, IMPORT_WORKERS)
     else:
         print("❌ JSON must be an array or object")
-        return
 
 
-def _import_simple_format(db, data):
-    """Import simple {channel_id: email} format."""
+def _batched(iterable, size):
+    """Yield lists of up to `size` items from any iterable."""
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _prefetched_batches(db, entries, ids_of, workers):
+    """
+    Yield (batch, existing leads by channel_id) for IMPORT_WRITE_BATCH-sized batches, in file
+    order, with up to `workers` batch lookups running while later batches are parsed.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        in_flight = deque()
+        for batch in _batched(entries, IMPORT_WRITE_BATCH):
+            in_flight.append((batch, pool.submit(db.get_leads_by_channels, ids_of(batch), IMPORT_FIELDS)))
+            if len(in_flight) >= workers:
+                batch, lookup = in_flight.popleft()
+                yield batch, lookup.result()
+        while in_flight:
+            batch, lookup = in_flight.popleft()
+            yield batch, lookup.result()
+
+
+def _import_simple_format(db, entries, workers=IMPORT_WORKERS):
+    """Import simple {channel_id: email} format, given as (channel_id, email) pairs."""
     success = 0
     not_found = 0
     
-    for channel_id, email in data.items():
-        if not isinstance(email, str) or "@" not in email:
-            print(f"  ⚠️ Skipping invalid: {channel_id}: {email}")
-            continue
+    def ids_of(batch):
+        return [channel_id for channel_id, _ in batch]
+    
+    # One query per batch instead of a lookup per entry
+    for batch, existing in _prefetched_batches(db, entries, ids_of, workers):
+        pending = []  # (channel_id, {"email": ...}) for this batch
         
-        lead = db.get_lead_by_channel(channel_id)
-        if lead:
-            db.update_email(channel_id, email)
-            creator = lead.get("creator_name", lead.get("channel_name", "Unknown"))
-            print(f"  ✅ {creator}: {email}")
-            success += 1
-        else:
-            print(f"  ❌ Not found: {channel_id}")
-            not_found += 1
+        for channel_id, email in batch:
+            if not isinstance(email, str) or "@" not in email:
+                print(f"  ⚠️ Skipping invalid: {channel_id}: {email}")
+                continue
+            
+            lead = existing.get(channel_id)
+            if lead:
+                pending.append((channel_id, {"email": email}))
+                creator = lead.get("creator_name", lead.get("channel_name", "Unknown"))
+                print(f"  ✅ {creator}: {email}")
+                success += 1
+            else:
+                print(f"  ❌ Not found: {channel_id}")
+                not_found += 1
+        
+        db.update_leads_bulk(pending, acknowledged=False)
     
     print(f"\n{'='*50}")
     print(f"Import Complete! Updated: {success}, Not Found: {not_found}")
@@ -211,61 +313,70 @@ def _import_simple_format(db, data):
         print(f"\nNext: python manage_leads.py approve-all")
 
 
-def _import_full_format(db, data):
+def _import_full_format(db, items, workers=IMPORT_WORKERS):
     """Import full format with email, video_url, video_title."""
     updated = 0
     not_found = 0
     needs_redraft = []
     
-    for item in data:
-        channel_id = item.get("channel_id")
-        if not channel_id:
-            print(f"  ⚠️ Skipping entry without channel_id")
-            continue
-        
-        lead = db.get_lead_by_channel(channel_id)
-        if not lead:
-            print(f"  ❌ Not found: {channel_id}")
-            not_found += 1
-            continue
-        
-        creator = lead.get("creator_name", lead.get("channel_name", "Unknown"))
-        changes = []
-        update_data = {}
-        redraft_needed = False
-        
-        # Check email
-        new_email = item.get("email", "").strip()
-        if new_email and new_email != lead.get("email", ""):
-            update_data["email"] = new_email
-            changes.append(f"email → {new_email}")
-        
-        # Check video_url (branded_player_url)
-        new_video_url = item.get("video_url", "").strip()
-        if new_video_url and new_video_url != lead.get("branded_player_url", ""):
-            update_data["branded_player_url"] = new_video_url
-            changes.append(f"video_url → {new_video_url[:40]}...")
-            redraft_needed = True
-        
-        # Check video_title
-        new_video_title = item.get("video_title", "").strip()
-        source_video = lead.get("source_video", {})
-        if new_video_title and new_video_title != source_video.get("title", ""):
-            update_data["source_video.title"] = new_video_title
-            changes.append(f"video_title → {new_video_title[:30]}...")
-            redraft_needed = True
+    def ids_of(batch):
+        return [item["channel_id"] for item in batch if isinstance(item, dict) and item.get("channel_id")]
+    
+    # One query per batch instead of a lookup per entry
+    for batch, existing in _prefetched_batches(db, items, ids_of, workers):
+        pending = []  # (channel_id, update_data) for this batch
         
-        if update_data:
-            db.update_lead_by_channel(channel_id, update_data)
-            print(f"  ✅ {creator}:")
-            for change in changes:
-                print(f"      {change}")
-            updated += 1
+        for item in batch:
+            channel_id = item.get("channel_id")
+            if not channel_id:
+                print(f"  ⚠️ Skipping entry without channel_id")
+                continue
             
-            if redraft_needed:
-                needs_redraft.append(channel_id)
-        else:
-            print(f"  - {creator}: no changes")
+            lead = existing.get(channel_id)
+            if not lead:
+                print(f"  ❌ Not found: {channel_id}")
+                not_found += 1
+                continue
+            
+            creator = lead.get("creator_name", lead.get("channel_name", "Unknown"))
+            changes = []
+            update_data = {}
+            redraft_needed = False
+            
+            # Check email
+            new_email = item.get("email", "").strip()
+            if new_email and new_email != lead.get("email", ""):
+                update_data["email"] = new_email
+                changes.append(f"email → {new_email}")
+            
+            # Check video_url (branded_player_url)
+            new_video_url = item.get("video_url", "").strip()
+            if new_video_url and new_video_url != lead.get("branded_player_url", ""):
+                update_data["branded_player_url"] = new_video_url
+                changes.append(f"video_url → {new_video_url[:40]}...")
+                redraft_needed = True
+            
+            # Check video_title
+            new_video_title = item.get("video_title", "").strip()
+            source_video = lead.get("source_video", {})
+            if new_video_title and new_video_title != source_video.get("title", ""):
+                update_data["source_video.title"] = new_video_title
+                changes.append(f"video_title → {new_video_title[:30]}...")
+                redraft_needed = True
+            
+            if update_data:
+                pending.append((channel_id, update_data))
+                print(f"  ✅ {creator}:")
+                for change in changes:
+                    print(f"      {change}")
+                updated += 1
+                
+                if redraft_needed:
+                    needs_redraft.append(channel_id)
+            else:
+                print(f"  - {creator}: no changes")
+        
+        db.update_leads_bulk(pending, acknowledged=False)
     
     print(f"\n{'='*50}")
     print(f"Import Complete!")
@@ -337,39 +448,35 @@ def cmd_export_for_emails(args):
 def cmd_approve(args):
     """Mark a lead's draft as ready to send."""
     db = get_db()
-    lead = db.get_lead_by_channel(args.channel_id)
+    lead = db.mark_ready_to_send(args.channel_id, APPROVE_FIELDS)
     
-    if not lead:
-        print(f"Lead not found: {args.channel_id}")
+    if lead:
+        print(f"✅ {lead['creator_name']} marked as ready_to_send")
+        print(f"   Subject: {lead['draft_email']['subject']}")
         return
     
-    if not lead.get("email"):
+    # Nothing matched: one more lookup to tell which precondition failed
+    lead = db.get_lead_by_channel(args.channel_id, APPROVE_FIELDS)
+    if not lead:
+        print(f"Lead not found: {args.channel_id}")
+    elif not lead.get("email"):
         print(f"⚠️ Warning: Lead has no email address!")
         print(f"   Use: python manage_leads.py set-email {args.channel_id} <email>")
-        return
-    
-    if not lead.get("draft_email", {}).get("subject"):
+    else:
         print(f"⚠️ Lead has no draft email. Run step 4 first.")
-        return
-    
-    db.mark_ready_to_send(args.channel_id)
-    print(f"✅ {lead['creator_name']} marked as ready_to_send")
-    print(f"   Subject: {lead['draft_email']['subject']}")
 
 
 def cmd_approve_all(args):
     """Approve all drafted leads that have emails."""
     db = get_db()
-    leads = db.get_leads_by_status(LeadStatus.DRAFTED)
+    # Both filters run in MongoDB on the (status, email) index
+    ready_leads = db.get_leads_ready_for_approval(APPROVAL_FIELDS)
+    no_email = db.get_drafted_leads_without_email(APPROVAL_FIELDS)
     
-    if not leads:
+    if not ready_leads and not no_email:
         print("No drafted leads to approve.")
         return
     
-    # Filter leads with emails
-    ready_leads = [l for l in leads if l.get("email")]
-    no_email = [l for l in leads if not l.get("email")]
-    
     if no_email:
         print(f"⚠️ {len(no_email)} leads have no email and will be skipped:")
         for l in no_email:
@@ -389,10 +496,7 @@ def cmd_approve_all(args):
             print("Cancelled.")
             return
     
-    approved = 0
-    for lead in ready_leads:
-        db.mark_ready_to_send(lead["channel_id"])
-        approved += 1
+    approved = db.mark_many_ready_to_send([l["channel_id"] for l in ready_leads])
     
     print(f"\n✅ Approved {approved} leads for sending")
     print(f"   Run: python 5_dispatch_emails.py")
@@ -401,7 +505,7 @@ def cmd_approve_all(args):
 def cmd_drafts(args):
     """View all drafted emails for review."""
     db = get_db()
-    leads = db.get_leads_by_status(LeadStatus.DRAFTED)
+    leads, with_email = db.get_drafts_for_review(DRAFT_FIELDS)
     
     if not leads:
         print("No drafted emails to review.")
@@ -432,8 +536,7 @@ def cmd_drafts(args):
         
         print(f"\n{'='*70}\n")
     
-    # Summary
-    with_email = sum(1 for l in leads if l.get("email"))
+    # Summary (email count computed by MongoDB alongside the drafts)
     print(f"Summary: {len(leads)} drafts, {with_email} with emails")
     print(f"\nTo approve all: python manage_leads.py approve-all")
     print(f"To approve one: python manage_leads.py approve <channel_id>")
@@ -475,13 +578,12 @@ def cmd_show_draft(args):
 def cmd_record_reply(args):
     """Record that a creator replied."""
     db = get_db()
-    lead = db.get_lead_by_channel(args.channel_id)
+    lead = db.record_reply(args.channel_id, args.content, fields=NAME_FIELDS)
     
     if not lead:
         print(f"Lead not found: {args.channel_id}")
         return
     
-    db.record_reply(args.channel_id, args.content)
     print(f"✅ Reply recorded for {lead['creator_name']}")
     print(f"   Status changed to: {LeadStatus.REPLIED}")
 
@@ -489,19 +591,10 @@ def cmd_record_reply(args):
 def cmd_add_note(args):
     """Add a note to a lead."""
     db = get_db()
-    lead = db.get_lead_by_channel(args.channel_id)
-    
-    if not lead:
+    if db.add_note(args.channel_id, args.note):
+        print(f"✅ Note added to {args.channel_id}")
+    else:
         print(f"Lead not found: {args.channel_id}")
-        return
-    
-    # Append to existing notes
-    existing = lead.get("notes", "")
-    timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
-    new_note = f"[{timestamp}] {args.note}\n"
-    
-    db.update_lead_by_channel(args.channel_id, {"notes": existing + new_note})
-    print(f"✅ Note added to {lead['creator_name']}")
 
 
 def cmd_set_status(args):
@@ -525,14 +618,16 @@ def cmd_set_status(args):
 def cmd_stats(args):
     """Show pipeline statistics."""
     db = get_db()
+    # One $group aggregation; every lead lands in exactly one group, so the groups sum to the total
     stats = db.get_pipeline_stats()
-    total = db.get_total_leads()
+    total = sum(stats.values())
+    largest = max(stats.values(), default=0)
     
     print("\n📊 PIPELINE STATISTICS")
     print("="*40)
     
     for status, count in sorted(stats.items()):
-        bar = "█" * int(count / max(stats.values()) * 20) if stats.values() else ""
+        bar = "█" * int(count / largest * 20) if largest else ""
         print(f"  {status:20} {count:4} {bar}")
     
     print("-"*40)
@@ -561,19 +656,22 @@ def cmd_search(args):
 def cmd_delete(args):
     """Delete a lead (with confirmation)."""
     db = get_db()
-    lead = db.get_lead_by_channel(args.channel_id)
-    
-    if not lead:
-        print(f"Lead not found: {args.channel_id}")
-        return
     
     if not args.force:
+        # The prompt needs the name before deleting; --force skips straight to the delete
+        lead = db.get_lead_by_channel(args.channel_id, NAME_FIELDS)
+        if not lead:
+            print(f"Lead not found: {args.channel_id}")
+            return
         confirm = input(f"Delete {lead['creator_name']}? [y/N]: ")
         if confirm.lower() != 'y':
             print("Cancelled.")
             return
     
-    db.delete_lead(args.channel_id)
+    lead = db.delete_lead(args.channel_id, NAME_FIELDS)
+    if not lead:
+        print(f"Lead not found: {args.channel_id}")
+        return
     print(f"✅ Deleted: {lead['creator_name']}")
 
 
@@ -592,6 +690,10 @@ Examples:
   python manage_leads.py approve UC123            # Mark ready to send
   python manage_leads.py reply UC123 "Thanks!"    # Record reply
   python manage_leads.py stats                    # Pipeline statistics
+
+import-emails sends its updates unacknowledged (w=0) for speed: the server doesn't
+confirm them, so a failed write isn't reported. Check a few leads with `show`
+afterwards. Single-lead commands (set-email, approve, ...) are always confirmed.
         """
     )
     
@@ -656,6 +758,10 @@ Examples:
     # import-emails
     p_import = subparsers.add_parser("import-emails", help="Import emails from JSON file")
     p_import.add_argument("file", help="Path to JSON file with emails")
+    p_import.add_argument("--legacy", action="store_true",
+                          help="Load the whole file first (validates it before writing anything)")
+    p_import.add_argument("--workers", type=int, default=IMPORT_WORKERS,
+                          help=f"Batches looked up in parallel (default: {IMPORT_WORKERS})")
     
     # export-for-emails
     p_export = subparsers.add_parser("export-for-emails", help="Export leads to JSON for email collection")
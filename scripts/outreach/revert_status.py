@@ -1,5 +1,7 @@
 
 import sys
+import argparse
+from datetime import datetime, timedelta
 from pathlib import Path
 
 # Add parent directory to path to import db_client
@@ -7,13 +9,26 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from db_client import get_db, LeadStatus
 
-def revert_status():
+def revert_status(older_than_minutes=None):
+    """
+    Move leads stuck in asset_generating back to approved. With older_than_minutes, only leads
+    untouched for that long are reverted, so a generation run still in progress keeps its leads.
+    """
     db = get_db()
+    query = {"status": LeadStatus.ASSET_GENERATING}
+    if older_than_minutes is not None:
+        query["updated_at"] = {"$lt": datetime.utcnow() - timedelta(minutes=older_than_minutes)}
+
     result = db.leads.update_many(
-        {"status": "asset_generating"},
-        {"$set": {"status": "approved"}}
+        query,
+        {"$set": {"status": LeadStatus.APPROVED, "updated_at": datetime.utcnow()}},
+        hint="status_active"  # Partial status index from db_client (covers asset_generating)
     )
     print(f"Reverted {result.modified_count} leads from 'asset_generating' to 'approved'.")
 
 if __name__ == "__main__":
-    revert_status()
+    parser = argparse.ArgumentParser(description="Revert leads stuck in asset_generating to approved")
+    parser.add_argument("--older-than-minutes", type=int,
+                        help="Only revert leads not updated in the last N minutes")
+    args = parser.parse_args()
+    revert_status(older_than_minutes=args.older_than_minutes)
@@ -8,6 +8,9 @@ import sys
 import requests
 from pathlib import Path
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+from urllib3.util.retry import Retry
 
 load_dotenv()
 
@@ -25,6 +28,16 @@ else:
 # Use first account for test
 account = ACCOUNTS[0]
 
+# One keep-alive session for every API call, so requests after login reuse its TLS connection.
+# Only connection failures and idempotent requests are retried (urllib3 never re-sends a POST
+# that reached the server).
+session = requests.Session()
+session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+))
+
 
 def login(account):
     """Login and return Bearer token."""
@@ -41,7 +54,7 @@ def login(account):
     }
     
     try:
-        resp = requests.post(f"{API_BASE_URL}/auth/login", json=payload, timeout=30)
+        resp = session.post(f"{API_BASE_URL}/auth/login", json=payload, timeout=30)
         resp.raise_for_status()
         data = resp.json()
         token = data.get("token")
@@ -77,15 +90,19 @@ def test_upload(token, audio_path):
     
     try:
         with open(audio_path, 'rb') as f:
-            files = {'audioFile': (audio_path.name, f, 'audio/mpeg')}
-            data = {
+            # Streamed from disk in chunks with a precomputed Content-Length, rather than
+            # requests building the whole multipart body in memory first
+            body = MultipartEncoder(fields={
                 'title': 'Test Video - Linear Equations',
                 'description': 'Test upload for API verification',
-                'videoOptions': json.dumps(video_options)
-            }
+                'videoOptions': json.dumps(video_options),
+                'audioFile': (audio_path.name, f, 'audio/mpeg')
+            })
             
             print(f"Uploading to {url}...")
-            resp = requests.post(url, headers=headers, files=files, data=data, timeout=120)
+            resp = session.post(
+                url, headers={**headers, "Content-Type": body.content_type}, data=body, timeout=300
+            )
             
             print(f"Response status: {resp.status_code}")
             print(f"Response headers: {dict(resp.headers)}")
@@ -18,12 +18,16 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import os
 from pathlib import Path
 import re
 import logging
+import random
 from typing import List
 
-from aws_bedrock_client import AWSBedrockClient
+import aiofiles
+
+from aws_bedrock_client import AWSBedrockClient, BedrockRequestError, BedrockThrottlingError, RateLimiter
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -33,8 +37,54 @@ DEFAULT_SYSTEM_PROMPT = """
 You are the Elite Creative Outreach Strategist for EulaIQ, a company building personalized AI instructors and an animation generation layer. Your job is to analyze raw lead data and produce an Outreach Dossier and a conversion-optimized cold email using the rules provided by the user.
 """
 
+# 'Transcript file: <name>' marker generate_prompts.py puts before each transcript
+TRANSCRIPT_MARKER_RE = re.compile(r"Transcript file:\s*.+?\n\n", re.I | re.S)
+WORD_RE = re.compile(r"\w+")
+
+# Write buffer for response files: streamed deltas are a few bytes each, so they're gathered
+# into large write() calls instead of flushing every 8 KiB
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Backoff between attempts for a file: min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**(attempt-1)),
+# stretched by up to RETRY_JITTER so concurrent files that failed together don't retry together
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+RETRY_JITTER = 0.5
+
+
+def retry_delay(attempt: int) -> float:
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)) * (1 + random.random() * RETRY_JITTER)
+
+
+class AdmissionController:
+    """
+    Concurrency gate whose limit can change mid-run (an asyncio.Semaphore can't be resized).
+    `active` calls are admitted while below `limit`; lowering the limit lets in-flight calls
+    finish and only holds back new ones.
+    """
+
+    def __init__(self, limit: int):
+        self.active = 0
+        self.limit = limit
+        self.cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self) -> None:
+        async with self.cond:
+            self.active -= 1
+            self.cond.notify(1)
 
-async def process_file(client: AWSBedrockClient, filepath: Path, out_dir: Path, system_prompt: str, force: bool = False, max_retries: int = 3, timeout: int = 120, sem: asyncio.Semaphore | None = None):
+    async def set_limit(self, limit: int) -> None:
+        async with self.cond:
+            self.limit = limit
+            self.cond.notify_all()
+
+
+async def process_file(client: AWSBedrockClient, filepath: Path, out_dir: Path, system_prompt: str, force: bool = False, max_retries: int = 3, timeout: int = 120, ctrl: AdmissionController | None = None, limiter: RateLimiter | None = None):
     name = filepath.name
     # parse leading serial (NN_...)
     try:
@@ -54,68 +104,114 @@ async def process_file(client: AWSBedrockClient, filepath: Path, out_dir: Path,
         logger.info(f"Target exists and --force not set, skipping: {target}")
         return False
 
-    prompt_text = filepath.read_text(encoding='utf-8')
+    # aiofiles runs the file I/O in a thread, so other files' Bedrock calls keep going meanwhile
+    async with aiofiles.open(filepath, 'r', encoding='utf-8') as f:
+        prompt_text = await f.read()
 
     # Heuristic check: if the prompt contains a transcript block with significant
     # textual content, explicitly flag that the transcript contains spoken audio
     # and insert a strong top-level instruction so the model doesn't assume silence.
     transcript_warning = ''
     # look for the 'Transcript file:' marker and following text
-    m = re.search(r"Transcript file:\s*.+?\n\n", prompt_text, re.I | re.S)
+    m = TRANSCRIPT_MARKER_RE.search(prompt_text)
     if m:
-        # extract the block after the marker (up to a following '3. company context' or similar)
+        # inspect the block after the marker (up to a following '3. company context' or similar)
         start = m.end()
-        tail = prompt_text[start: start + 5000]  # inspect a slice
-        # count words — if >30 words, likely has spoken audio
-        word_count = len(re.findall(r"\w+", tail))
+        # count words in the next 5000 chars — if >30 words, likely has spoken audio
+        # (stops at the 31st word instead of listing every match)
+        word_count = 0
+        for _ in WORD_RE.finditer(prompt_text, start, start + 5000):
+            word_count += 1
+            if word_count > 30:
+                break
         if word_count > 30:
             transcript_warning = "\n\n[NOTE FOR MODEL: the following transcript contains SPOKEN AUDIO — do NOT infer the creator is 'silent' unless the transcript is empty or explicitly marked no speech.]\n\n"
             # also add a strong top-level flag at the very beginning of the prompt
             # so the model cannot miss the instruction
             top_flag = "[TRANSCRIPT_HAS_SPOKEN_AUDIO: TRUE]\n\n"
-            prompt_text = top_flag + prompt_text[:start] + transcript_warning + prompt_text[start:]
+            # built in one join: chained + would copy the whole prompt into three temporaries
+            prompt_text = "".join((top_flag, prompt_text[:start], transcript_warning, prompt_text[start:]))
 
     # prefer the primary model (Sonnet 4.5) per request
     model = client.primary_model_id
 
     attempt = 0
-    response_text = None
+    written = False
     last_exc = None
+    # Streamed into a sibling file and renamed on success, so an interrupted stream never
+    # leaves a truncated target that a later run without --force would skip
+    partial = target.with_name(target.name + '.part')
 
     async def do_call():
-        return await client.converse(prompt_text, system=system_prompt, model_id=model, timeout=timeout)
-
-    # use semaphore for concurrency control if provided
+        output_tokens = 0
+        async with aiofiles.open(partial, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+            async for event in client.converse_stream(prompt_text, system=system_prompt, model_id=model, timeout=timeout):
+                if 'contentBlockDelta' in event:
+                    await f.write(event['contentBlockDelta'].get('delta', {}).get('text', ''))
+                elif 'metadata' in event:
+                    output_tokens += event['metadata'].get('usage', {}).get('outputTokens', 0)
+        os.replace(partial, target)
+        return output_tokens
+
+    # use the admission controller for concurrency control if provided
     while attempt < max_retries:
         attempt += 1
         try:
-            if sem is not None:
-                async with sem:
-                    result = await do_call()
+            # Pace request starts to the quota before taking a concurrency slot, so waiting for
+            # a token never holds a slot
+            if limiter is not None:
+                await limiter.acquire()
+            if ctrl is not None:
+                # The slot is held for the whole stream, not just until the first byte
+                await ctrl.acquire()
+                try:
+                    output_tokens = await do_call()
+                finally:
+                    await ctrl.release()
             else:
-                result = await do_call()
+                output_tokens = await do_call()
 
-            response_text = result.get('text', '')
+            written = True
             break
 
+        except BedrockThrottlingError as e:
+            # Still throttled after the client's own retries: back off the whole run, not just this file
+            last_exc = e
+            if ctrl is not None and ctrl.limit > 1:
+                await ctrl.set_limit(max(1, ctrl.limit // 2))
+                logger.warning(f"Bedrock throttling, concurrency lowered to {ctrl.limit}")
+
+        except BedrockRequestError as e:
+            last_exc = e
+            if not e.retryable:
+                # Validation / access errors fail identically on every attempt
+                logger.warning(f"Not retrying {name}: {e}")
+                break
+
         except Exception as e:
+            # Timeouts, dropped connections, malformed responses
             last_exc = e
-            logger.warning(f"Attempt {attempt}/{max_retries} failed for {name}: {e}")
-            # exponential backoff small jitter
-            await asyncio.sleep(attempt * 1.5)
 
-    if response_text is None:
+        logger.warning(f"Attempt {attempt}/{max_retries} failed for {name}: {last_exc}")
+        if attempt < max_retries:
+            await asyncio.sleep(retry_delay(attempt))
+
+    if not written:
         logger.exception(f"Error calling Bedrock for {name}: {last_exc}")
-        response_text = f"[ERROR] Bedrock request failed: {last_exc}\n\nOriginal prompt:\n" + prompt_text[:2000]
+        if partial.exists():
+            partial.unlink()
+        async with aiofiles.open(target, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+            await f.write(f"[ERROR] Bedrock request failed: {last_exc}\n\nOriginal prompt:\n" + prompt_text[:2000])
+        return True
 
-    # Write to target
-    target.write_text(response_text, encoding='utf-8')
-    logger.info(f"Wrote response for {name} -> {target}")
+    logger.info(f"Wrote response for {name} -> {target} ({output_tokens} output tokens)")
     return True
 
 
-async def main_async(prompts_dir: Path, out_dir: Path, system_prompt: str, files: List[str], force: bool, concurrency: int = 4, retries: int = 3, timeout: int = 120):
-    client = AWSBedrockClient()
+async def main_async(prompts_dir: Path, out_dir: Path, system_prompt: str, files: List[str], force: bool, concurrency: int = 4, retries: int = 3, timeout: int = 120, rpm: float | None = None, burst: int = 1):
+    # One client for every file; keep_alive pools its HTTPS connections, so only the first
+    # `concurrency` calls pay a TLS handshake
+    client = AWSBedrockClient(keep_alive=True)
     out_dir.mkdir(parents=True, exist_ok=True)
 
     # find files
@@ -126,10 +222,15 @@ async def main_async(prompts_dir: Path, out_dir: Path, system_prompt: str, files
 
     results = []
     # concurrency value passed by CLI in args
-    sem = asyncio.Semaphore(concurrency)
+    ctrl = AdmissionController(concurrency)
+    # token bucket for the request rate (--rpm), on top of the concurrency cap
+    limiter = RateLimiter(rpm / 60, burst) if rpm else None
 
-    tasks = [process_file(client, p, out_dir, system_prompt, force=force, max_retries=retries, timeout=timeout, sem=sem) for p in paths]
-    results_raw = await asyncio.gather(*tasks)
+    tasks = [process_file(client, p, out_dir, system_prompt, force=force, max_retries=retries, timeout=timeout, ctrl=ctrl, limiter=limiter) for p in paths]
+    try:
+        results_raw = await asyncio.gather(*tasks)
+    finally:
+        await client.close()
     for p, ok in zip(paths, results_raw):
         results.append((p.name, ok))
 
@@ -147,6 +248,8 @@ def main():
     parser.add_argument('--concurrency', type=int, default=4, help='Number of parallel requests to run')
     parser.add_argument('--retries', type=int, default=3, help='Retries per file on failure')
     parser.add_argument('--timeout', type=int, default=120, help='HTTP request timeout in seconds')
+    parser.add_argument('--rpm', type=float, default=None, help='Max Bedrock requests per minute (default: no rate limit)')
+    parser.add_argument('--burst', type=int, default=1, help='Requests allowed back-to-back before --rpm pacing applies')
     args = parser.parse_args()
 
     prompts_dir = Path(args.prompts)
@@ -157,7 +260,7 @@ def main():
     else:
         system_prompt = DEFAULT_SYSTEM_PROMPT
 
-    asyncio.run(main_async(prompts_dir, out_dir, system_prompt, args.files or [], force=args.force, concurrency=args.concurrency, retries=args.retries, timeout=args.timeout))
+    asyncio.run(main_async(prompts_dir, out_dir, system_prompt, args.files or [], force=args.force, concurrency=args.concurrency, retries=args.retries, timeout=args.timeout, rpm=args.rpm, burst=args.burst))
 
 
 if __name__ == '__main__':
@@ -18,12 +18,21 @@ Default: max-chars=3000 (approx safe input size). Use --dry-run to preview.
 from __future__ import annotations
 
 import argparse
+import os
 import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Optional
 
 
 TRANSCRIPT_HEADER_RE = re.compile(r"---\s*\n\s*Transcript file:\s*(?P<fname>.+?)\s*\n---\s*\n\s*", re.I | re.S)
+# Where a transcript ends: the next numbered '3. company context' section, else the next '---' divider
+TRANSCRIPT_TAIL_RE = re.compile(r"\n\s*3\.\s*company context", re.I)
+SECTION_DIVIDER_RE = re.compile(r"\n---\s*\n")
+
+# Write buffer for rewritten prompts: a whole prompt in one write() instead of 8 KiB chunks
+WRITE_BUFFER_SIZE = 1 << 20
 
 
 def truncate_text(text: str, max_chars: Optional[int], max_lines: Optional[int]) -> str:
@@ -50,18 +59,23 @@ def process_file(path: Path, max_chars: Optional[int], max_lines: Optional[int],
     header_end = m.end()
 
     # try to find end of transcript — look for next numbered section '3. company context' or end of file
-    tail_match = re.search(r"\n\s*3\.\s*company context", txt[header_end:], re.I)
+    # (searching from pos=header_end rather than on a txt[header_end:] copy)
+    tail_match = TRANSCRIPT_TAIL_RE.search(txt, header_end)
     if tail_match:
-        transcript_end = header_end + tail_match.start()
+        transcript_end = tail_match.start()
     else:
         # if not found, attempt to find next '---' divider that starts at column
-        next_div = re.search(r"\n---\s*\n", txt[header_end:])
+        next_div = SECTION_DIVIDER_RE.search(txt, header_end)
         if next_div:
-            transcript_end = header_end + next_div.start()
+            transcript_end = next_div.start()
         else:
             # fallback: until end of file
             transcript_end = len(txt)
 
+    # Short enough already: settle it from the offsets without copying the transcript out
+    if max_lines is None and (max_chars is None or transcript_end - header_end <= max_chars):
+        return False
+
     transcript = txt[header_end:transcript_end]
 
     new_transcript = truncate_text(transcript, max_chars, max_lines)
@@ -69,21 +83,29 @@ def process_file(path: Path, max_chars: Optional[int], max_lines: Optional[int],
     if new_transcript == transcript:
         return False
 
-    new_txt = txt[:header_end] + new_transcript + txt[transcript_end:]
-
     if dry_run:
         print(f"Would truncate: {path} (original {len(transcript)} chars -> {len(new_transcript)} chars)")
         return True
 
-    # backup original
+    # One join sizes the result once; chained + would build two intermediate copies
+    new_txt = "".join((txt[:header_end], new_transcript, txt[transcript_end:]))
+
+    # write the new content next to the original first, so the original path always holds
+    # a complete file even if we're killed part-way
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(new_txt)
+
+    # backup original (hard link: no data copied; copy if the filesystem can't link)
     backup = path.with_suffix(path.suffix + '.orig')
     if not backup.exists():
-        path.replace(backup)
-        # write modified content to original filename
-        path.write_text(new_txt, encoding='utf-8')
-    else:
-        # if backup already exists, just overwrite file
-        path.write_text(new_txt, encoding='utf-8')
+        try:
+            os.link(path, backup)
+        except OSError:
+            shutil.copy2(path, backup)
+
+    # swap in the modified content with a single atomic rename
+    os.replace(tmp, path)
 
     print(f"Truncated: {path} (new size {len(new_transcript)} chars) — backup saved to {backup.name}")
     return True
@@ -95,6 +117,7 @@ def main():
     parser.add_argument('--max-chars', type=int, default=3000)
     parser.add_argument('--max-lines', type=int, default=None)
     parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--workers', type=int, default=None, help='Processes to truncate files in (default: one per CPU)')
     args = parser.parse_args()
 
     path = Path(args.dir)
@@ -104,10 +127,12 @@ def main():
     files = sorted([p for p in path.iterdir() if p.is_file() and p.suffix in {'.md', '.txt'}])
     changed = 0
 
-    for f in files:
-        ok = process_file(f, args.max_chars, args.max_lines, dry_run=args.dry_run)
-        if ok:
-            changed += 1
+    # Files are independent, so the regex and rewrite work spreads across processes
+    with ProcessPoolExecutor(max_workers=args.workers) as ex:
+        futures = [ex.submit(process_file, f, args.max_chars, args.max_lines, args.dry_run) for f in files]
+        for fut in futures:
+            if fut.result():
+                changed += 1
 
     print(f"Processed {len(files)} files — changed {changed} files")
 
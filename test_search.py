@@ -3,22 +3,40 @@ import sys
 sys.path.insert(0, "scripts")
 from db_client import get_db
 
+# Only the fields printed below (matched keywords trimmed to 3 by MongoDB)
+LEAD_PROJECTION = {
+    "_id": 0,
+    "channel_name": 1,
+    "subscriber_count": 1,
+    "subscriber_tier": 1,
+    "pre_score": 1,
+    "subject_classification.subject_tier": 1,
+    "subject_classification.matched_keywords": {"$slice": 3},
+}
+
+TIER_EMOJI = {"sweet_spot": "⭐", "big": "🔥", "small": "📈", "unknown": "❓"}
+
+# One row per lead, filled with format_map
+ROW = "{name:35} | {subs:>12} subs | {tier:12} {emoji} | score: {score:2} | {subject} {matched}"
+
 db = get_db()
-leads = list(db.leads.find({}))
+# Streamed in batches: rows print as the first batch arrives, and memory stays flat
+leads = db.leads.find({}, LEAD_PROJECTION).batch_size(200)
 
 print(f"\n{'='*80}")
-print(f"LEADS IN MONGODB: {len(leads)}")
+print(f"LEADS IN MONGODB: {db.leads.estimated_document_count()}")
 print(f"{'='*80}")
 
 for lead in leads:
-    name = lead.get('channel_name', 'Unknown')[:35]
     subs = lead.get('subscriber_count')
-    subs_str = f"{subs:,}" if subs else "?"
     tier = lead.get('subscriber_tier', '?')
-    score = lead.get('pre_score', '?')
-    subject = lead.get('subject_classification', {}).get('subject_tier', '?')
-    matched = lead.get('subject_classification', {}).get('matched_keywords', [])[:3]
-    
-    tier_emoji = {"sweet_spot": "⭐", "big": "🔥", "small": "📈", "unknown": "❓"}.get(tier, "")
-    
-    print(f"{name:35} | {subs_str:>12} subs | {tier:12} {tier_emoji} | score: {score:2} | {subject} {matched}")
+    classification = lead.get('subject_classification', {})
+    print(ROW.format_map({
+        "name": lead.get('channel_name', 'Unknown')[:35],
+        "subs": f"{subs:,}" if subs else "?",
+        "tier": tier,
+        "emoji": TIER_EMOJI.get(tier, ""),
+        "score": lead.get('pre_score', '?'),
+        "subject": classification.get('subject_tier', '?'),
+        "matched": classification.get('matched_keywords', []),
+    }))